@@ -0,0 +1,25 @@
+"""
+Helpers which are shared by the benchmarks
+"""
+import os
+import sys
+import timeit
+from typing import Callable, Dict, Union
+
+# Benchmark the pycache of this checkout, also if it is not installed. Every benchmark imports this module first.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def bench(statement: Union[str, Callable], number: int = 200_000, repeat: int = 5, setup: str = "pass",
+          globals_: dict = None) -> float:
+    """
+    :return: The fastest time of one call in nanoseconds
+    """
+    return min(timeit.repeat(statement, setup=setup, number=number, repeat=repeat, globals=globals_)) / number * 1e9
+
+
+def result(value: float, unit: str) -> Dict[str, Union[float, str]]:
+    """
+    One machine readable result, lower values are better
+    """
+    return {"value": round(value, 3), "unit": unit}
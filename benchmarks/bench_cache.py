@@ -0,0 +1,139 @@
+"""
+Measure the hit and miss latency of cached functions compared to functools.lru_cache,
+the cost of an eviction for every policy and cache size, and the memory one cache entry uses.
+
+Run with: python benchmarks/bench_cache.py
+"""
+import asyncio
+import functools
+import gc
+import tracemalloc
+from itertools import count
+from time import perf_counter
+from typing import Dict
+
+from _timing import bench, result
+from pycache import cache
+
+EVICTION_POLICIES = ("fifo", "lru", "lfu", "tinylfu")
+CACHE_SIZES = (10, 1_000, 100_000)
+
+
+def _async_bench(coroutine_function, number: int, repeat: int = 5) -> float:
+    """
+    :return: The fastest time of one await in nanoseconds
+    """
+    async def calls():
+        for _ in range(number):
+            await coroutine_function()
+
+    loop = asyncio.new_event_loop()
+    try:
+        timings = []
+        for _ in range(repeat):
+            start = perf_counter()
+            loop.run_until_complete(calls())
+            timings.append(perf_counter() - start)
+    finally:
+        loop.close()
+    return min(timings) / number * 1e9
+
+
+def hit_latency(number: int) -> Dict[str, dict]:
+    @cache(expires_every="*:*:100")
+    def cached(a, b):
+        return a + b
+
+    @functools.lru_cache(maxsize=128)
+    def lru_cached(a, b):
+        return a + b
+
+    @cache(expires_every="*:*:100")
+    async def async_cached(a, b):
+        return a + b
+
+    return {
+        "cache.hit.sync": result(bench(lambda: cached(1, 2), number), "ns"),
+        "cache.hit.async": result(_async_bench(lambda: async_cached(1, 2), number), "ns"),
+        "cache.hit.lru_cache": result(bench(lambda: lru_cached(1, 2), number), "ns"),
+    }
+
+
+def miss_latency(number: int) -> Dict[str, dict]:
+    # Every call uses a new argument and the caches are large enough, so that nothing is evicted
+    size = number * 6
+
+    @cache(expires_every="*:*:100", max_cache_size=size)
+    def cached(a):
+        return a
+
+    @functools.lru_cache(maxsize=size)
+    def lru_cached(a):
+        return a
+
+    @cache(expires_every="*:*:100", max_cache_size=size)
+    async def async_cached(a):
+        return a
+
+    sync_keys, lru_keys, async_keys = count(), count(), count()
+    return {
+        "cache.miss.sync": result(bench(lambda: cached(next(sync_keys)), number), "ns"),
+        "cache.miss.async": result(_async_bench(lambda: async_cached(next(async_keys)), number), "ns"),
+        "cache.miss.lru_cache": result(bench(lambda: lru_cached(next(lru_keys)), number), "ns"),
+    }
+
+
+def eviction_cost(number: int) -> Dict[str, dict]:
+    """
+    A miss in a full cache, which has to evict an entry for the new one
+    """
+    results = {}
+    for size in CACHE_SIZES:
+        for eviction in EVICTION_POLICIES:
+            @cache(expires_every="*:*:100", max_cache_size=size, eviction=eviction)
+            def cached(a):
+                return a
+
+            keys = count()
+            for _ in range(size):
+                cached(next(keys))
+            results[f"cache.evict.{eviction}.{size}"] = result(bench(lambda: cached(next(keys)), number), "ns")
+    return results
+
+
+def memory_per_entry(entries: int) -> Dict[str, dict]:
+    def measure(decorator) -> float:
+        func = decorator(lambda a: a)
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for key in range(entries):
+            # Large integers, so that the arguments are not cached by the interpreter
+            func(key + 1_000_000)
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        return used / entries
+
+    return {
+        "cache.memory_per_entry": result(measure(cache(expires_every="*:*:100", max_cache_size=entries)), "bytes"),
+        "cache.memory_per_entry.lru_cache": result(measure(functools.lru_cache(maxsize=entries)), "bytes"),
+    }
+
+
+def run(quick: bool = False) -> Dict[str, dict]:
+    number = 20_000 if quick else 200_000
+    results = {}
+    results.update(hit_latency(number))
+    results.update(miss_latency(number // 4))
+    results.update(eviction_cost(number // 4))
+    results.update(memory_per_entry(10_000 if quick else 100_000))
+    return results
+
+
+def main():
+    for name, value in run().items():
+        print(f"{name:<40}{value['value']:>12.0f} {value['unit']}")
+
+
+if __name__ == "__main__":
+    main()
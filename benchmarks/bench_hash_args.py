@@ -0,0 +1,49 @@
+"""
+Compare the argument key building of the cache with functools._make_key, which is used by functools.lru_cache.
+
+Run with: python benchmarks/bench_hash_args.py
+"""
+import functools
+from typing import Dict
+
+from _timing import bench, result
+from pycache._cache._memmory_db import DataCache
+
+CASES = {
+    "3 positional": ((1, "two", 3.0), {}),
+    "20 positional": (tuple(range(20)), {}),
+    "2 positional, 3 keyword": ((1, 2), {"c": 3, "a": 1, "b": 2}),
+    "200 positional": (tuple(range(200)), {}),
+    "1 unhashable": (([1, 2, 3], 4), {}),
+    "3 unhashable": (([1, 2, 3], {"a": 1}, {1, 2}), {}),
+}
+
+
+def run(quick: bool = False) -> Dict[str, dict]:
+    number = 20_000 if quick else 200_000
+    results = {}
+    for name, (args, kwargs) in CASES.items():
+        results[f"hash_args.{name}"] = result(bench(lambda: DataCache.hash_args(args, kwargs), number), "ns")
+        results[f"hash_args.typed.{name}"] = result(bench(lambda: DataCache.hash_args(args, kwargs, True), number),
+                                                    "ns")
+        results[f"hash_args.content.{name}"] = result(
+            bench(lambda: DataCache.hash_args(args, kwargs, False, True), number), "ns"
+        )
+    return results
+
+
+def main():
+    print(f"{'case':<26}{'hash_args':>12}{'typed':>12}{'_make_key':>12}")
+    for name, (args, kwargs) in CASES.items():
+        hash_args = bench(lambda: DataCache.hash_args(args, kwargs))
+        typed = bench(lambda: DataCache.hash_args(args, kwargs, True))
+        try:
+            make_key = f"{bench(lambda: hash(functools._make_key(args, kwargs, False))):.0f} ns"
+        except TypeError:
+            # lru_cache does not support unhashable arguments
+            make_key = "n/a"
+        print(f"{name:<26}{hash_args:>9.0f} ns{typed:>9.0f} ns{make_key:>12}")
+
+
+if __name__ == "__main__":
+    main()
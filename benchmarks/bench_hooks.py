@@ -0,0 +1,53 @@
+"""
+Measure what the event hooks cost on the hit path of a cached function.
+Without hooks, the wrapper only checks if the callback list is empty, which is compared to the whole hit here.
+
+Run with: python benchmarks/bench_hooks.py
+"""
+from typing import Dict
+
+from _timing import bench, result
+from pycache import cache, add_hook, remove_hook
+
+
+def run(quick: bool = False) -> Dict[str, dict]:
+    number = 20_000 if quick else 200_000
+
+    @cache(expires_every="*:*:100")
+    def cached(a, b):
+        return a + b
+
+    cached(1, 2)
+
+    # The check the wrapper does for every event, once with and once without it
+    check_cost = bench("if hooks:\n    pass", number, 7, setup="hooks = []") - bench("pass", number, 7)
+    no_hooks = bench(lambda: cached(1, 2), number, 7)
+
+    def on_hit(func, key):
+        pass
+
+    add_hook("hit", on_hit)
+    try:
+        no_op_hook = bench(lambda: cached(1, 2), number, 7)
+    finally:
+        remove_hook("hit", on_hit)
+
+    return {
+        "hooks.hit_without_hooks": result(no_hooks, "ns"),
+        "hooks.hit_with_no_op_hook": result(no_op_hook, "ns"),
+        "hooks.empty_check": result(check_cost, "ns"),
+    }
+
+
+def main():
+    results = run()
+    no_hooks = results["hooks.hit_without_hooks"]["value"]
+    no_op_hook = results["hooks.hit_with_no_op_hook"]["value"]
+    check_cost = results["hooks.empty_check"]["value"]
+    print(f"{'hit without hooks':<28}{no_hooks:>9.0f} ns")
+    print(f"{'hit with a no-op hook':<28}{no_op_hook:>9.0f} ns")
+    print(f"{'empty hook check':<28}{check_cost:>9.1f} ns ({check_cost / no_hooks:.2%} of a hit)")
+
+
+if __name__ == "__main__":
+    main()
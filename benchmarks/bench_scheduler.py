@@ -0,0 +1,62 @@
+"""
+Measure how precisely the scheduler fires with 1, 100 and 1000 subscriptions.
+Jitter is how late a call happens after its deadline, drift is how much later the last call of a subscription
+happens than its first one.
+
+Run with: python benchmarks/bench_scheduler.py
+"""
+from collections import defaultdict
+from statistics import mean
+from time import sleep
+from typing import Dict, List
+
+from _timing import result
+from pycache import add_schedule, add_hook, remove_hook
+
+SUBSCRIPTIONS = (1, 100, 1000)
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent))]
+
+
+def fire_timing(subscriptions: int, rounds: int) -> Dict[str, dict]:
+    lateness = defaultdict(list)
+
+    def on_fire(subscription, late):
+        lateness[subscription].append(late)
+
+    add_hook("fire", on_fire)
+    try:
+        running = [add_schedule(lambda: None, "0:0:1") for _ in range(subscriptions)]
+        sleep(rounds + 0.5)
+        for subscription in running:
+            subscription.stop()
+    finally:
+        remove_hook("fire", on_fire)
+
+    all_lateness = [late for values in lateness.values() for late in values]
+    drift = mean(abs(values[-1] - values[0]) for values in lateness.values())
+    return {
+        f"schedule.jitter.p50.{subscriptions}": result(_percentile(all_lateness, 0.5) * 1000, "ms"),
+        f"schedule.jitter.p99.{subscriptions}": result(_percentile(all_lateness, 0.99) * 1000, "ms"),
+        f"schedule.jitter.max.{subscriptions}": result(max(all_lateness) * 1000, "ms"),
+        f"schedule.drift.{subscriptions}": result(drift * 1000, "ms"),
+    }
+
+
+def run(quick: bool = False) -> Dict[str, dict]:
+    results = {}
+    for subscriptions in SUBSCRIPTIONS[:2] if quick else SUBSCRIPTIONS:
+        results.update(fire_timing(subscriptions, 2 if quick else 5))
+    return results
+
+
+def main():
+    for name, value in run().items():
+        print(f"{name:<32}{value['value']:>10.3f} {value['unit']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Compare two result files of benchmarks/run.py. Lower values are better for all results.
+Exits with 1 if a result got worse by more than the threshold, so it can be used in CI.
+
+Run with: python benchmarks/compare.py old.json new.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="How many percent a result can get worse before it counts as regression")
+    args = parser.parse_args()
+
+    with open(args.old) as file:
+        old = json.load(file)["results"]
+    with open(args.new) as file:
+        new = json.load(file)["results"]
+
+    regressions = 0
+    print(f"{'benchmark':<44}{'old':>12}{'new':>12}{'change':>10}")
+    for name in sorted(old.keys() | new.keys()):
+        if name not in old or name not in new:
+            print(f"{name:<44}{'only in ' + ('new' if name in new else 'old'):>34}")
+            continue
+
+        old_value, new_value = old[name]["value"], new[name]["value"]
+        change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+        marker = ""
+        if change > args.threshold:
+            regressions += 1
+            marker = "  regression"
+        unit = new[name]["unit"]
+        print(f"{name:<44}{old_value:>9.1f} {unit:<2}{new_value:>9.1f} {unit:<2}{change:>+9.1f}%{marker}")
+
+    if regressions:
+        print(f"\n{regressions} results got worse by more than {args.threshold}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Run all benchmarks and write the results as JSON, so that they can be compared between commits.
+
+Run with: python benchmarks/run.py --output results.json [--quick] [--only cache scheduler]
+Compare with: python benchmarks/compare.py old.json new.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from typing import Optional
+
+import bench_cache
+import bench_hash_args
+import bench_hooks
+import bench_scheduler
+import pycache
+
+SUITES = {
+    "cache": bench_cache,
+    "hash_args": bench_hash_args,
+    "hooks": bench_hooks,
+    "scheduler": bench_scheduler,
+}
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", "-o", help="The JSON file the results are written to, defaults to stdout")
+    parser.add_argument("--quick", action="store_true", help="Less iterations, for a fast check")
+    parser.add_argument("--only", nargs="+", choices=SUITES, default=list(SUITES), help="The suites which are run")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only:
+        print(f"Running {name}", file=sys.stderr)
+        results.update(SUITES[name].run(args.quick))
+
+    report = {
+        "meta": {
+            "commit": _commit(),
+            "version": pycache.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+            "date": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,24 @@
 __version__ = '0.3.2'
 
 # noinspection PyUnresolvedReferences
-from ._cache._cache import cache
+from ._cache._cache import cache, set_global_max_bytes, cache_stats
+# noinspection PyUnresolvedReferences
+from ._cache._method import cached_method
+# noinspection PyUnresolvedReferences
+from ._cache._eviction import EvictionPolicy
+# noinspection PyUnresolvedReferences
+from ._cache._sweeper import purge_expired, start_expiry_sweeper
 # noinspection PyUnresolvedReferences
 from ._scheduler._scheduler import add_schedule, schedule, ScheduleSubscription
+# noinspection PyUnresolvedReferences
+from ._scheduler._async_engine import AsyncScheduler
+# noinspection PyUnresolvedReferences
+from ._shared._hooks import add_hook, remove_hook
+# noinspection PyUnresolvedReferences
+from ._backends._backend import CacheBackend, AsyncCacheBackend
+# noinspection PyUnresolvedReferences
+from ._backends._sqlite import SQLiteBackend
+# noinspection PyUnresolvedReferences
+from ._backends._shared_memory import SharedMemoryBackend
+# noinspection PyUnresolvedReferences
+from ._backends._redis import RedisBackend, AsyncRedisBackend, RedisError
@@ -0,0 +1,145 @@
+import atexit
+import hashlib
+import io
+import pickle
+import queue
+import threading
+from typing import Any, Optional, Tuple, Hashable, List, Dict, Callable
+
+WRITE_POLICIES = ("write_through", "write_behind")
+
+
+class CacheBackend:
+    """
+    A second cache tier behind the in memory cache of a function.
+    Keys are strings, values are any picklable object and the ttl is given in seconds.
+    """
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """
+        :return: The value and its remaining ttl, or None if the key is missing or expired
+        """
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def get_many(self, keys: List[str]) -> List[Optional[Tuple[Any, float]]]:
+        """
+        :return: The value and the remaining ttl of every key, in the order of the keys
+        """
+        return [self.get(key) for key in keys]
+
+    def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        for key, value in items.items():
+            self.set(key, value, ttl)
+
+
+class AsyncCacheBackend:
+    """
+    The same as a CacheBackend, but the methods are coroutines. Can only be used for coroutine functions.
+    """
+
+    async def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Tuple[Any, float]]]:
+        return [await self.get(key) for key in keys]
+
+    async def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        for key, value in items.items():
+            await self.set(key, value, ttl)
+
+
+class _Sorted(tuple):
+    """
+    The elements of a set in a fixed order
+    """
+
+
+def _canonical(value: Any) -> Any:
+    """
+    Sets are pickled in the order of their hashes, but the hashes of strings are different in every process.
+    Replace them with their elements in the order of their pickled representation.
+    """
+    if isinstance(value, (tuple, list)):
+        # A HashedKey is a list which also pickles its hash, so it becomes a tuple as well
+        return tuple(map(_canonical, value))
+    if isinstance(value, (set, frozenset)):
+        return _Sorted(sorted(map(_canonical, value), key=_dumps))
+    return value
+
+
+def _dumps(value: Any) -> bytes:
+    """
+    Pickle a value without the memo. The memo refers to repeated objects by their identity, so (s, s) and (s, t)
+    would be pickled differently, even if s == t.
+    """
+    buffer = io.BytesIO()
+    pickler = pickle.Pickler(buffer, protocol=4)
+    pickler.fast = True
+    pickler.dump(value)
+    return buffer.getvalue()
+
+
+def backend_key(namespace: str, key: Hashable) -> Optional[str]:
+    """
+    Serialize a cache key, so that it is the same in every process.
+    :return: The key or None if it can not be serialized (for example arguments which are compared by identity)
+    """
+    try:
+        data = _dumps(_canonical(key))
+    except Exception:
+        return None
+    return f"{namespace}:{hashlib.blake2b(data, digest_size=20).hexdigest()}"
+
+
+class WriteBehindQueue:
+    """
+    Writes values to a backend in a background thread, so that the caller does not wait for the backend.
+    Pending writes are flushed when the interpreter exits.
+    """
+
+    def __init__(self, backend: CacheBackend, on_error: Callable[[Exception], None] = None):
+        """
+        :param on_error: Called with the exception of every failed write
+        """
+        self._backend = backend
+        self._on_error = on_error
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="pycache-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._queue.put((self._backend.set, (key, value, ttl)))
+
+    def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        self._queue.put((self._backend.set_many, (items, ttl)))
+
+    def flush(self) -> None:
+        """
+        Wait until all queued values are written
+        """
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            write, args = self._queue.get()
+            try:
+                write(*args)
+            except Exception as ex:
+                # The value is still in the memory cache, so a failed write only costs a later miss
+                if self._on_error is not None:
+                    self._on_error(ex)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,301 @@
+import asyncio
+import math
+import pickle
+import socket
+import threading
+from asyncio import AbstractEventLoop
+from typing import Any, Optional, Tuple, List, Dict, Sequence
+
+from pycache._backends._backend import CacheBackend, AsyncCacheBackend
+
+
+class RedisError(Exception):
+    """
+    An error reply of the server
+    """
+
+
+def _encode(commands: Sequence[Sequence[Any]]) -> bytes:
+    """
+    Encode commands in the RESP protocol, so that all of them can be sent at once
+    """
+    parts = []
+    for command in commands:
+        parts.append(b"*%d\r\n" % len(command))
+        for argument in command:
+            if isinstance(argument, str):
+                argument = argument.encode()
+            elif not isinstance(argument, bytes):
+                argument = str(argument).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(argument), argument))
+    return b"".join(parts)
+
+
+def _parse_line(line: bytes) -> Tuple[bytes, bytes]:
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("The connection to the server was closed")
+    return line[:1], line[1:-2]
+
+
+def _ttl_command(key: str) -> tuple:
+    return "PTTL", key
+
+
+def _set_command(key: str, value: Any, ttl: float) -> tuple:
+    # Redis does not accept an expiry of 0 milliseconds
+    return "SET", key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), "PX", max(1, math.ceil(ttl * 1000))
+
+
+def _entries(replies: List[Any]) -> List[Optional[Tuple[Any, float]]]:
+    """
+    Convert the replies of GET and PTTL pairs to values and their remaining ttl
+    """
+    entries = []
+    for value, ttl in zip(replies[::2], replies[1::2]):
+        if value is None or ttl == -2:
+            entries.append(None)
+        else:
+            # -1 means the key has no expiry
+            entries.append((pickle.loads(value), ttl / 1000 if ttl >= 0 else float("inf")))
+    return entries
+
+
+class _Connection:
+    def __init__(self, host: str, port: int, timeout: Optional[float]):
+        self._socket = socket.create_connection((host, port), timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._socket.makefile("rb")
+
+    def execute(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        """
+        Send all commands in one pipeline and read their replies
+        """
+        self._socket.sendall(_encode(commands))
+        replies = [self._read() for _ in commands]
+        # Raise after all replies are read, so that the connection can still be used
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def _read(self) -> Any:
+        kind, data = _parse_line(self._reader.readline())
+        if kind == b"+":
+            return data
+        if kind == b"-":
+            return RedisError(data.decode())
+        if kind == b":":
+            return int(data)
+        if kind == b"$":
+            length = int(data)
+            if length == -1:
+                return None
+            return self._reader.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(data)
+            return None if length == -1 else [self._read() for _ in range(length)]
+        raise ConnectionError(f"Unknown reply type {kind!r}")
+
+    def close(self) -> None:
+        self._reader.close()
+        self._socket.close()
+
+
+class RedisBackend(CacheBackend):
+    """
+    Stores the values in a Redis compatible server, so that several hosts share one cache.
+    Connections are pooled and bulk operations are pipelined, so they only need one round trip.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, password: str = None,
+                 max_connections: int = 10, timeout: float = None):
+        """
+        :param max_connections: How many connections can be open at the same time, other threads wait for a connection
+        :param timeout: The timeout of socket operations in seconds
+        """
+        self._host = host
+        self._port = port
+        self._db = db
+        self._password = password
+        self._timeout = timeout
+        self._idle: List[_Connection] = []
+        self._lock = threading.Lock()
+        self._available = threading.BoundedSemaphore(max_connections)
+
+    def _connect(self) -> _Connection:
+        connection = _Connection(self._host, self._port, self._timeout)
+        commands = []
+        if self._password is not None:
+            commands.append(("AUTH", self._password))
+        if self._db:
+            commands.append(("SELECT", self._db))
+        if commands:
+            connection.execute(commands)
+        return connection
+
+    def _execute(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        with self._available:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                connection = self._connect()
+
+            try:
+                replies = connection.execute(commands)
+            except RedisError:
+                self._release(connection)
+                raise
+            except Exception:
+                # The state of the connection is unknown, so it is not reused
+                connection.close()
+                raise
+            self._release(connection)
+            return replies
+
+    def _release(self, connection: _Connection) -> None:
+        with self._lock:
+            self._idle.append(connection)
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        return self.get_many([key])[0]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._execute([_set_command(key, value, ttl)])
+
+    def delete(self, key: str) -> None:
+        self._execute([("DEL", key)])
+
+    def get_many(self, keys: List[str]) -> List[Optional[Tuple[Any, float]]]:
+        if not keys:
+            return []
+        commands = []
+        for key in keys:
+            commands.append(("GET", key))
+            commands.append(_ttl_command(key))
+        return _entries(self._execute(commands))
+
+    def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        if items:
+            self._execute([_set_command(key, value, ttl) for key, value in items.items()])
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._idle:
+                connection.close()
+            self._idle.clear()
+
+
+class _AsyncConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+
+    async def execute(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        self._writer.write(_encode(commands))
+        await self._writer.drain()
+        replies = [await self._read() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    async def _read(self) -> Any:
+        kind, data = _parse_line(await self._reader.readline())
+        if kind == b"+":
+            return data
+        if kind == b"-":
+            return RedisError(data.decode())
+        if kind == b":":
+            return int(data)
+        if kind == b"$":
+            length = int(data)
+            if length == -1:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(data)
+            return None if length == -1 else [await self._read() for _ in range(length)]
+        raise ConnectionError(f"Unknown reply type {kind!r}")
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class AsyncRedisBackend(AsyncCacheBackend):
+    """
+    The asyncio variant of the RedisBackend. Connections belong to an event loop, so every loop has its own pool.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, password: str = None,
+                 max_connections: int = 10):
+        self._host = host
+        self._port = port
+        self._db = db
+        self._password = password
+        self._max_connections = max_connections
+        self._pools: Dict[AbstractEventLoop, Tuple[List[_AsyncConnection], asyncio.Semaphore]] = {}
+
+    def _pool(self) -> Tuple[List[_AsyncConnection], asyncio.Semaphore]:
+        loop = asyncio.get_event_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            # The connections reference their loop, so the pools of closed loops have to be dropped explicitly
+            for closed_loop in [other for other in self._pools if other.is_closed()]:
+                del self._pools[closed_loop]
+            pool = self._pools[loop] = ([], asyncio.Semaphore(self._max_connections))
+        return pool
+
+    async def _connect(self) -> _AsyncConnection:
+        connection = _AsyncConnection(*await asyncio.open_connection(self._host, self._port))
+        commands = []
+        if self._password is not None:
+            commands.append(("AUTH", self._password))
+        if self._db:
+            commands.append(("SELECT", self._db))
+        if commands:
+            await connection.execute(commands)
+        return connection
+
+    async def _execute(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        idle, available = self._pool()
+        async with available:
+            connection = idle.pop() if idle else await self._connect()
+            try:
+                replies = await connection.execute(commands)
+            except RedisError:
+                idle.append(connection)
+                raise
+            except BaseException:
+                # Also a cancelled call leaves unread replies on the connection
+                connection.close()
+                raise
+            idle.append(connection)
+            return replies
+
+    async def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        return (await self.get_many([key]))[0]
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._execute([_set_command(key, value, ttl)])
+
+    async def delete(self, key: str) -> None:
+        await self._execute([("DEL", key)])
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Tuple[Any, float]]]:
+        if not keys:
+            return []
+        commands = []
+        for key in keys:
+            commands.append(("GET", key))
+            commands.append(_ttl_command(key))
+        return _entries(await self._execute(commands))
+
+    async def set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        if items:
+            await self._execute([_set_command(key, value, ttl) for key, value in items.items()])
+
+    def close(self) -> None:
+        idle, _ = self._pool()
+        for connection in idle:
+            connection.close()
+        idle.clear()
@@ -0,0 +1,180 @@
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Optional, Tuple, Iterator
+
+from pycache._backends._backend import CacheBackend
+
+_MAGIC = b"pycache1"
+# magic, number of slots, size of a slot
+_HEADER = struct.Struct("<8sII")
+# state, digest of the key, expires at, last access, length of the value
+_SLOT = struct.Struct("<B20sddI")
+
+_EMPTY = 0
+_USED = 1
+
+# How many slots after the home slot of a key are searched
+_PROBES = 8
+
+
+class SharedMemoryBackend(CacheBackend):
+    """
+    A hash table in a memory mapped file, which is shared by all processes on one host that open the same file.
+    Every key has a window of slots it can be stored in. If the window is full, the expired or least recently
+    used entry of the window is replaced.
+    The file is locked with POSIX record locks, so the backend can be created before the workers are forked.
+    Like every backend it is a second tier: Every process still keeps the values it read or computed in its own memory
+    cache, so use a small max_cache_size if the memory of the processes matters.
+    """
+
+    def __init__(self, path: str, slots: int = 4096, slot_size: int = 4096):
+        """
+        :param path: The file of the table, for example in /dev/shm.
+                     Processes which use the same file share the entries.
+        :param slots: The maximal amount of entries
+        :param slot_size: The size of one entry in bytes. Pickled values which do not fit are not stored.
+        """
+        try:
+            import fcntl
+        except ImportError:
+            raise Exception("The shared memory backend needs fcntl, which is only available on Unix")
+
+        if slots < 1:
+            raise Exception("Slots cannot be smaller than 1")
+        if slot_size <= _SLOT.size:
+            raise Exception(f"Slot size has to be larger than {_SLOT.size} bytes")
+
+        self._fcntl = fcntl
+        self._slots = slots
+        self._slot_size = slot_size
+        self._pid = os.getpid()
+        self._thread_lock = threading.Lock()
+
+        size = _HEADER.size + slots * slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _HEADER.pack(_MAGIC, slots, slot_size), 0)
+            header = _HEADER.unpack(os.pread(self._fd, _HEADER.size, 0))
+        except Exception:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            raise
+        fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+        if header != (_MAGIC, slots, slot_size):
+            os.close(self._fd)
+            raise Exception(f"{path} is not a cache file with {slots} slots of {slot_size} bytes")
+        self._map = mmap.mmap(self._fd, size)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        if self._pid != os.getpid():
+            # A forked worker must not inherit the thread lock in the state the parent had while forking
+            self._pid = os.getpid()
+            self._thread_lock = threading.Lock()
+
+        # Record locks only exclude other processes, the threads of this process need their own lock
+        with self._thread_lock:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN)
+
+    def _offsets(self, digest: bytes) -> Iterator[int]:
+        home = int.from_bytes(digest[:8], "little") % self._slots
+        for probe in range(min(_PROBES, self._slots)):
+            yield _HEADER.size + (home + probe) % self._slots * self._slot_size
+
+    def _find(self, digest: bytes) -> Optional[int]:
+        for offset in self._offsets(digest):
+            state, slot_digest, _, _, _ = _SLOT.unpack_from(self._map, offset)
+            if state == _USED and slot_digest == digest:
+                return offset
+        return None
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        digest = _digest(key)
+        now = time.time()
+
+        with self._locked():
+            offset = self._find(digest)
+            if offset is None:
+                return None
+            _, _, expires_at, _, length = _SLOT.unpack_from(self._map, offset)
+            if expires_at <= now:
+                return None
+            _SLOT.pack_into(self._map, offset, _USED, digest, expires_at, now, length)
+            data = self._map[offset + _SLOT.size:offset + _SLOT.size + length]
+
+        return pickle.loads(data), expires_at - now
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if _SLOT.size + len(data) > self._slot_size:
+            # The value is still cached in the memory of this process
+            return
+
+        digest = _digest(key)
+        now = time.time()
+
+        with self._locked():
+            target, target_rank = None, None
+            for offset in self._offsets(digest):
+                state, slot_digest, expires_at, last_access, _ = _SLOT.unpack_from(self._map, offset)
+                if state == _USED and slot_digest == digest:
+                    target = offset
+                    break
+
+                # Prefer empty slots, then expired entries and then the least recently used entry
+                if state != _USED:
+                    rank = (0, 0.0)
+                elif expires_at <= now:
+                    rank = (1, last_access)
+                else:
+                    rank = (2, last_access)
+                if target_rank is None or rank < target_rank:
+                    target, target_rank = offset, rank
+
+            _SLOT.pack_into(self._map, target, _USED, digest, now + ttl, now, len(data))
+            self._map[target + _SLOT.size:target + _SLOT.size + len(data)] = data
+
+    def delete(self, key: str) -> None:
+        digest = _digest(key)
+        with self._locked():
+            offset = self._find(digest)
+            if offset is not None:
+                self._map[offset] = _EMPTY
+
+    def purge_expired(self) -> int:
+        """
+        Remove the expired entries from the table
+        :return: The number of removed entries
+        """
+        now = time.time()
+        removed = 0
+        with self._locked():
+            for index in range(self._slots):
+                offset = _HEADER.size + index * self._slot_size
+                state, _, expires_at, _, _ = _SLOT.unpack_from(self._map, offset)
+                if state == _USED and expires_at <= now:
+                    self._map[offset] = _EMPTY
+                    removed += 1
+        return removed
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode(), digest_size=20).digest()
@@ -0,0 +1,65 @@
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+from pycache._backends._backend import CacheBackend
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Persists cache entries in a SQLite file, so that they survive a restart of the process.
+    Values are pickled and the expiry is stored as wall clock time. Reads go through a memory mapping of the file.
+    """
+
+    def __init__(self, path: str, mmap_size: int = 256 * 1024 * 1024):
+        self._path = path
+        self._mmap_size = mmap_size
+        # A sqlite connection can only be used in the thread which created it
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA mmap_size={int(self._mmap_size)}")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        row = self._connection().execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        ttl = row[1] - time.time()
+        if ttl <= 0:
+            return None
+        return pickle.loads(row[0]), ttl
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time() + ttl),
+        )
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def purge_expired(self) -> int:
+        """
+        Remove the expired entries from the file
+        :return: The number of removed entries
+        """
+        return self._connection().execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
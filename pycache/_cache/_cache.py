@@ -1,12 +1,29 @@
 import asyncio
 import functools
-from typing import Callable
+import threading
+from time import monotonic, perf_counter
+from typing import Callable, Type, Union, Any, Optional, Hashable, Dict, Iterable, Tuple
 
-from ._memmory_db import DataCache, FunctionCache
-from .._shared._parser import get_schedule_type
+from ._eviction import EvictionPolicy
+from ._freeze import UncacheableArguments, DEFAULT_MAX_HASH_BYTES
+from ._memmory_db import DataCache, FunctionCache, SegmentedFunctionCache, MISSING
+from ._refresh import RefreshAhead
+from ._single_flight import SingleFlight, AsyncSingleFlight
+from ._stats import CacheInfo, CacheStatistics
+from .._backends._backend import CacheBackend, AsyncCacheBackend, WriteBehindQueue, backend_key, WRITE_POLICIES
+from .._scheduler._background import BackgroundRunner
+from .._shared._hooks import Hooks
+from .._shared._parser import compile_schedule, ScheduleType
 
 
-def cache(expires_every: str = None, expires_at: str = None, max_cache_size=50) -> Callable:
+def cache(expires_every: str = None, expires_at: str = None, max_cache_size=50,
+          eviction: Union[str, Type[EvictionPolicy]] = "fifo", coalesce: bool = False, thread_safe: bool = False,
+          segments: int = 16, stale_while_revalidate: str = None, max_bytes: int = None,
+          sizeof: Callable[[Any], int] = None, typed: bool = False, key: Callable[..., Hashable] = None,
+          hash_by_content: bool = False, max_hash_bytes: int = DEFAULT_MAX_HASH_BYTES,
+          backend: Union[CacheBackend, AsyncCacheBackend] = None, write_policy: str = "write_through",
+          namespace: str = None, batch: Callable[[list], Iterable] = None, refresh_ahead: str = None,
+          refresh_ahead_keys: int = 10, refresh_ahead_concurrency: int = 2) -> Callable:
     """
     Cache the results of a method or function with the arguments of the function
     :param expires_every: A string which specifies every how many hours/minutes/seconds the cache expires
@@ -17,38 +34,504 @@ def cache(expires_every: str = None, expires_at: str = None, max_cache_size=50)
                      For example a string like this `**:30:00` will cause the cache to expire every hour at 30 past.
                      For example a string like this `18:30:00` will cause the cache to expire every day at 18:30:00
     :param max_cache_size: The maximal amount of cache results per method which should be cached
+    :param eviction: Which entry gets removed once the cache is full. All policies work in O(1).
+                     fifo: The oldest entry (default)
+                     lru: The least recently used entry
+                     lfu: The least frequently used entry
+                     tinylfu: The least recently used entry, but only if the new entry is requested more often
+                     You can also pass your own subclass of EvictionPolicy.
+    :param coalesce: Compute a missing value only once if it is requested concurrently.
+                     Other threads/tasks wait for the running computation and share its result.
+    :param thread_safe: Split the cache into segments with their own lock, so that many threads which store values
+                        do not wait for one lock. Reads stay lock free.
+    :param segments: The number of segments of a thread safe cache
+    :param stale_while_revalidate: A string which specifies how long (hh:mm:ss) an expired value is still returned.
+                                   Inside this window the expired value is returned immediately and a refresh
+                                   runs in the background (thread pool for sync, task for async functions).
+    :param max_bytes: The maximal amount of memory the cache results of the method should use.
+                      Entries are evicted until a new value fits, values larger than max_bytes are not cached.
+                      Of the few entries the eviction policy would evict next, the largest one is evicted first.
+    :param sizeof: A function which returns the size of a value in bytes. Defaults to a deep sys.getsizeof.
+    :param typed: Cache arguments of different types separately, for example 3 and 3.0
+    :param key: A function which is called with the arguments of the cached function and returns a hashable cache key.
+                Replaces the default key building.
+    :param hash_by_content: Compare unhashable arguments (lists, dicts, sets, dataclasses, NumPy arrays, ...) by their
+                            content. By default they are compared by identity, so an equal list is a cache miss.
+    :param max_hash_bytes: Calls whose unhashable arguments contain more data than this are not cached,
+                           if they are hashed by content.
+    :param backend: A second cache tier, for example a SQLiteBackend which keeps the values over restarts.
+                    Values which are not in memory are looked up in the backend before the function is called.
+                    Coroutine functions can also use an AsyncCacheBackend.
+    :param write_policy: How new values are written to the backend
+                         write_through: Write the value before the function returns (default)
+                         write_behind: Write the value in a background thread
+    :param namespace: The prefix of the keys in the backend. Defaults to the module and qualified name of the
+                      function. Functions which are defined inside another function need their own namespace,
+                      otherwise every function created there would share the same backend entries.
+    :param batch: A function which computes many values at once and is used by get_many.
+                  It is called with a list of positional argument tuples and has to return the results in the same
+                  order. Coroutine functions can use a coroutine function as batch function.
+    :param refresh_ahead: A string which specifies how long (hh:mm:ss) before their deadline the most hit entries are
+                          recomputed in the background, so that they do not expire all at once.
+    :param refresh_ahead_keys: How many of the most hit entries are recomputed per refresh_ahead window
+    :param refresh_ahead_concurrency: How many entries are recomputed at the same time
     """
     data_cache = DataCache()
+    background_runner = BackgroundRunner()
+    hooks = Hooks()
+    # Only the emptiness of the lists is checked on the hot path, so no hooks cost nothing
+    hit_hooks = hooks.callbacks["hit"]
+    miss_hooks = hooks.callbacks["miss"]
+    store_hooks = hooks.callbacks["store"]
 
     if max_cache_size < 1:
         raise Exception("Max cache size cannot be smaller than 1")
+    if write_policy not in WRITE_POLICIES:
+        raise Exception(f"Unknown write policy {write_policy}, use one of {', '.join(WRITE_POLICIES)}")
 
-    schedule_type, schedule_str = get_schedule_type(expires_every, expires_at)
+    # Parse the schedule only once and not on every cache insert
+    schedule = compile_schedule(expires_every, expires_at)
+    stale_window = compile_schedule(expires_every=stale_while_revalidate).interval if stale_while_revalidate else 0
+    refresh_window = compile_schedule(expires_every=refresh_ahead).interval if refresh_ahead else 0
+    if refresh_ahead:
+        if refresh_window <= 0:
+            raise Exception("Refresh ahead has to be longer than 0 seconds")
+        if schedule.schedule_type == ScheduleType.EVERY and refresh_window >= schedule.interval:
+            raise Exception("Refresh ahead has to be shorter than the expiry interval")
+        if refresh_ahead_keys < 1 or refresh_ahead_concurrency < 1:
+            raise Exception("Refresh ahead needs at least one key and one concurrent refresh")
+
+    if key:
+        def make_key(args, kwargs):
+            return key(*args, **kwargs)
+    elif typed or hash_by_content:
+        def make_key(args, kwargs):
+            return DataCache.hash_args(args, kwargs, typed, hash_by_content, max_hash_bytes)
+    else:
+        make_key = DataCache.hash_args
 
     def function_wrapper(func: Callable):
-        func_cache = FunctionCache(max_cache_size)
+        if backend is not None and namespace is None and "<locals>" in func.__qualname__:
+            raise Exception(f"{func.__qualname__} is defined inside another function, pass a namespace to share "
+                            f"its values in the backend")
+
+        if thread_safe:
+            func_cache = SegmentedFunctionCache(max_cache_size, schedule, eviction, stale_window, max_bytes, sizeof,
+                                                segments=segments)
+        else:
+            func_cache = FunctionCache(max_cache_size, schedule, eviction, stale_window, max_bytes, sizeof)
+        # The registry is only used for introspection and global operations, calls use the function cache directly
         data_cache.add_function_cache(func, func_cache)
+        lookup = func_cache.lookup
+        stats = func_cache.stats
+
+        single_flight = None
+        if coalesce:
+            single_flight = AsyncSingleFlight() if asyncio.iscoroutinefunction(func) else SingleFlight()
+
+        # Keys in the backend have to be unique over all cached functions and processes
+        key_namespace = namespace or f"{func.__module__}.{func.__qualname__}"
+        async_backend = isinstance(backend, AsyncCacheBackend)
+        if async_backend and not asyncio.iscoroutinefunction(func):
+            raise Exception("An async backend can only be used for coroutine functions")
+        if asyncio.iscoroutinefunction(batch) and not asyncio.iscoroutinefunction(func):
+            raise Exception("An async batch function can only be used for coroutine functions")
+
+        def backend_failed(exception: Exception) -> None:
+            # An unreachable backend must not break the function, so its errors are misses and skipped writes
+            hooks.emit("backend_error", func, exception)
+
+        def read_backend(read, *args):
+            try:
+                return read(*args)
+            except Exception as ex:
+                backend_failed(ex)
+                return None
+
+        def write_backend(write, *args) -> None:
+            try:
+                write(*args)
+            except Exception as ex:
+                backend_failed(ex)
+
+        async def async_read_backend(read, *args):
+            try:
+                return await read(*args)
+            except Exception as ex:
+                backend_failed(ex)
+                return None
+
+        async def async_write_backend(write, *args) -> None:
+            try:
+                await write(*args)
+            except Exception as ex:
+                backend_failed(ex)
+
+        writer = backend
+        if backend is not None and not async_backend and write_policy == "write_behind":
+            writer = WriteBehindQueue(backend, backend_failed)
+
+        refresher: Optional[RefreshAhead] = None
+
+        def store(key, value, deadline=None, arguments=None) -> float:
+            if deadline is None:
+                deadline = schedule.next_monotonic_deadline()
+            func_cache.add_cache_entry(key, value, deadline, arguments)
+            if data_cache.max_bytes is not None:
+                data_cache.enforce_max_bytes(func_cache)
+            if store_hooks:
+                hooks.emit("store", func, key, value)
+            if refresher is not None:
+                refresher.start()
+            return deadline
+
+        def load(key, args, kwargs):
+            # Another thread could have stored the value while this one waited for the flight
+            value = lookup(key)
+            if value is not MISSING:
+                return value
+
+            backend_id = backend_key(key_namespace, key) if backend is not None else None
+            if backend_id is not None:
+                entry = read_backend(backend.get, backend_id)
+                if entry is not None:
+                    value, ttl = entry
+                    store(key, value, monotonic() + ttl, (args, kwargs))
+                    return value
+            return compute(key, args, kwargs, backend_id)
+
+        def compute(key, args, kwargs, backend_id, deadline=None):
+            value = func(*args, **kwargs)
+            deadline = store(key, value, deadline, (args, kwargs))
+            if backend_id is not None:
+                write_backend(writer.set, backend_id, value, deadline - monotonic())
+            return value
+
+        async def async_load(key, args, kwargs):
+            value = lookup(key)
+            if value is not MISSING:
+                return value
+
+            backend_id = backend_key(key_namespace, key) if backend is not None else None
+            if backend_id is not None:
+                if async_backend:
+                    entry = await async_read_backend(backend.get, backend_id)
+                else:
+                    entry = read_backend(backend.get, backend_id)
+                if entry is not None:
+                    value, ttl = entry
+                    store(key, value, monotonic() + ttl, (args, kwargs))
+                    return value
+            return await async_compute(key, args, kwargs, backend_id)
+
+        async def async_compute(key, args, kwargs, backend_id, deadline=None):
+            value = await func(*args, **kwargs)
+            deadline = store(key, value, deadline, (args, kwargs))
+            if backend_id is not None:
+                ttl = deadline - monotonic()
+                if not async_backend:
+                    write_backend(writer.set, backend_id, value, ttl)
+                elif write_policy == "write_behind":
+                    background_runner.create_task(async_write_backend(backend.set, backend_id, value, ttl))
+                else:
+                    await async_write_backend(backend.set, backend_id, value, ttl)
+            return value
+
+        refreshing = set()
+        refreshing_lock = threading.Lock()
+
+        def start_refresh(key) -> bool:
+            # Only one background refresh per key
+            with refreshing_lock:
+                if key in refreshing:
+                    return False
+                refreshing.add(key)
+                return True
+
+        def refresh(key, args, kwargs):
+            try:
+                load(key, args, kwargs)
+            finally:
+                refreshing.discard(key)
+
+        async def async_refresh(key, args, kwargs):
+            try:
+                await async_load(key, args, kwargs)
+            finally:
+                refreshing.discard(key)
+
+        def refresh_hot_key(key, args, kwargs, deadline):
+            # The value is still valid, so it is computed without looking it up and expires at the next deadline
+            if start_refresh(key):
+                try:
+                    backend_id = backend_key(key_namespace, key) if backend is not None else None
+                    compute(key, args, kwargs, backend_id, schedule.deadline_after(deadline))
+                finally:
+                    refreshing.discard(key)
+
+        async def async_refresh_hot_key(key, args, kwargs, deadline):
+            if start_refresh(key):
+                try:
+                    backend_id = backend_key(key_namespace, key) if backend is not None else None
+                    await async_compute(key, args, kwargs, backend_id, schedule.deadline_after(deadline))
+                finally:
+                    refreshing.discard(key)
+
+        if refresh_ahead:
+            refresher = RefreshAhead(
+                func_cache, refresh_window, refresh_ahead_keys, refresh_ahead_concurrency,
+                async_refresh_hot_key if asyncio.iscoroutinefunction(func) else refresh_hot_key
+            )
+
+        def lookup_many(calls):
+            """
+            Look up all calls in one pass
+            :return: The values in the order of the calls with MISSING for the misses, the indexes and arguments of
+                     the missing keys, the keys which can not be cached and the stale keys which need a refresh
+            """
+            values = [MISSING] * len(calls)
+            missing: Dict[Hashable, list] = {}
+            missing_args: Dict[Hashable, tuple] = {}
+            uncacheable = set()
+            stale = []
+            for index, args in enumerate(calls):
+                try:
+                    key = make_key(args, {})
+                except UncacheableArguments:
+                    # Computed like a miss, but not stored
+                    key = object()
+                    uncacheable.add(key)
+                else:
+                    value = lookup(key)
+                    if value is MISSING and stale_window:
+                        value = func_cache.lookup_stale(key)
+                        if value is not MISSING and start_refresh(key):
+                            stale.append((key, args))
+                    if value is not MISSING:
+                        values[index] = value
+                        stats.hit()
+                        if hit_hooks:
+                            hooks.emit("hit", func, key)
+                        continue
+
+                # The same arguments are only computed once per batch
+                missing.setdefault(key, []).append(index)
+                missing_args[key] = args
+            return values, missing, missing_args, uncacheable, stale
+
+        def backend_ids_of(missing, uncacheable) -> Dict[Hashable, str]:
+            backend_ids = {}
+            if backend is not None:
+                for key in missing:
+                    backend_id = backend_key(key_namespace, key) if key not in uncacheable else None
+                    if backend_id is not None:
+                        backend_ids[key] = backend_id
+            return backend_ids
+
+        def store_backend_entries(backend_ids, entries, missing_args, results) -> None:
+            if entries is None:
+                # The backend failed, so all keys are computed
+                return
+            for (key, backend_id), entry in zip(list(backend_ids.items()), entries):
+                if entry is not None:
+                    value, ttl = entry
+                    store(key, value, monotonic() + ttl, (missing_args[key], {}))
+                    results[key] = value
+                    # Only computed values are written back
+                    del backend_ids[key]
+
+        def store_computed(keys, computed, missing_args, uncacheable, backend_ids,
+                           results) -> Tuple[Dict[str, Any], float]:
+            """
+            :return: The values which have to be written to the backend and their time to live
+            """
+            computed = list(computed)
+            if len(computed) != len(keys):
+                raise Exception(f"The batch function returned {len(computed)} results for {len(keys)} calls")
+
+            # All values are computed at the same time, so they share a deadline
+            deadline = schedule.next_monotonic_deadline()
+            written = {}
+            for key, value in zip(keys, computed):
+                results[key] = value
+                if key not in uncacheable:
+                    store(key, value, deadline, (missing_args[key], {}))
+                    if key in backend_ids:
+                        written[backend_ids[key]] = value
+            return written, deadline - monotonic()
+
+        def fill_missing(values, missing, results, start) -> list:
+            latency = perf_counter() - start
+            for key, indexes in missing.items():
+                for index in indexes:
+                    values[index] = results[key]
+                    stats.miss(latency)
+                    if miss_hooks:
+                        hooks.emit("miss", func, key, latency)
+            return values
+
+        def get_many(calls: Iterable[tuple]) -> list:
+            """
+            Get the results of many calls at once. Only the calls which are not cached are computed, with one call of
+            the batch function if there is one.
+            :param calls: A tuple of positional arguments for every call
+            :return: The results in the order of the calls
+            """
+            start = perf_counter()
+            values, missing, missing_args, uncacheable, stale = lookup_many(list(calls))
+            for key, args in stale:
+                background_runner.submit(refresh, key, args, {})
+            if not missing:
+                return values
+
+            results = {}
+            backend_ids = backend_ids_of(missing, uncacheable)
+            if backend_ids:
+                entries = read_backend(backend.get_many, list(backend_ids.values()))
+                store_backend_entries(backend_ids, entries, missing_args, results)
+
+            keys = [key for key in missing if key not in results]
+            if keys:
+                arguments = [missing_args[key] for key in keys]
+                computed = batch(arguments) if batch else [func(*args) for args in arguments]
+                written, ttl = store_computed(keys, computed, missing_args, uncacheable, backend_ids, results)
+                if written:
+                    write_backend(writer.set_many, written, ttl)
+            return fill_missing(values, missing, results, start)
+
+        async def async_get_many(calls: Iterable[tuple]) -> list:
+            """
+            Get the results of many calls at once. Only the calls which are not cached are computed, with one call of
+            the batch function if there is one.
+            :param calls: A tuple of positional arguments for every call
+            :return: The results in the order of the calls
+            """
+            start = perf_counter()
+            values, missing, missing_args, uncacheable, stale = lookup_many(list(calls))
+            for key, args in stale:
+                background_runner.create_task(async_refresh(key, args, {}))
+            if not missing:
+                return values
+
+            results = {}
+            backend_ids = backend_ids_of(missing, uncacheable)
+            if backend_ids:
+                ids = list(backend_ids.values())
+                if async_backend:
+                    entries = await async_read_backend(backend.get_many, ids)
+                else:
+                    entries = read_backend(backend.get_many, ids)
+                store_backend_entries(backend_ids, entries, missing_args, results)
+
+            keys = [key for key in missing if key not in results]
+            if keys:
+                arguments = [missing_args[key] for key in keys]
+                if batch is None:
+                    computed = await asyncio.gather(*(func(*args) for args in arguments))
+                elif asyncio.iscoroutinefunction(batch):
+                    computed = await batch(arguments)
+                else:
+                    computed = batch(arguments)
+                written, ttl = store_computed(keys, computed, missing_args, uncacheable, backend_ids, results)
+                if written:
+                    if not async_backend:
+                        write_backend(writer.set_many, written, ttl)
+                    elif write_policy == "write_behind":
+                        background_runner.create_task(async_write_backend(backend.set_many, written, ttl))
+                    else:
+                        await async_write_backend(backend.set_many, written, ttl)
+            return fill_missing(values, missing, results, start)
 
         @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
-            key = DataCache.hash_args(args, kwargs)
-            if data_cache.is_in_cache(key, func):
-                value = data_cache.get_value_from_cache(key, func)
+            try:
+                key = make_key(args, kwargs)
+            except UncacheableArguments:
+                return func(*args, **kwargs)
+            value = lookup(key)
+            if value is MISSING and stale_window:
+                # Return the expired value and refresh it in the background
+                value = func_cache.lookup_stale(key)
+                if value is not MISSING and start_refresh(key):
+                    background_runner.submit(refresh, key, args, kwargs)
+
+            if value is not MISSING:
+                stats.hit()
+                if hit_hooks:
+                    hooks.emit("hit", func, key)
             else:
-                value = func(*args, **kwargs)
-                func_cache.add_cache_entry(key, value, schedule_type, schedule_str)
+                start = perf_counter()
+                if single_flight:
+                    value = single_flight.do(key, load, key, args, kwargs)
+                else:
+                    value = load(key, args, kwargs)
+                latency = perf_counter() - start
+                stats.miss(latency)
+                if miss_hooks:
+                    hooks.emit("miss", func, key, latency)
             return value
 
         @functools.wraps(func)
         async def async_wrapper(*args, **kwargs):
-            key = DataCache.hash_args(args, kwargs)
-            if data_cache.is_in_cache(key, func):
-                value = data_cache.get_value_from_cache(key, func)
+            try:
+                key = make_key(args, kwargs)
+            except UncacheableArguments:
+                return await func(*args, **kwargs)
+            value = lookup(key)
+            if value is MISSING and stale_window:
+                # Return the expired value and refresh it in the background
+                value = func_cache.lookup_stale(key)
+                if value is not MISSING and start_refresh(key):
+                    background_runner.create_task(async_refresh(key, args, kwargs))
+
+            if value is not MISSING:
+                stats.hit()
+                if hit_hooks:
+                    hooks.emit("hit", func, key)
             else:
-                value = await func(*args, **kwargs)
-                func_cache.add_cache_entry(key, value, schedule_type, schedule_str)
+                start = perf_counter()
+                if single_flight:
+                    value = await single_flight.do(key, async_load, key, args, kwargs)
+                else:
+                    value = await async_load(key, args, kwargs)
+                latency = perf_counter() - start
+                stats.miss(latency)
+                if miss_hooks:
+                    hooks.emit("miss", func, key, latency)
             return value
 
-        return async_wrapper if asyncio.iscoroutinefunction(func) else sync_wrapper
+        if asyncio.iscoroutinefunction(func):
+            wrapper = async_wrapper
+            wrapper.get_many = async_get_many
+        else:
+            wrapper = sync_wrapper
+            wrapper.get_many = get_many
+
+        def cache_info() -> CacheInfo:
+            statistics = func_cache.statistics()
+            return CacheInfo(statistics.hits, statistics.misses, max_cache_size, statistics.size)
+
+        wrapper.purge_expired = func_cache.purge_expired
+        wrapper.cache_info = cache_info
+        wrapper.cache_stats = func_cache.statistics
+        if isinstance(writer, WriteBehindQueue):
+            wrapper.flush = writer.flush
+        return wrapper
 
     return function_wrapper
+
+
+def set_global_max_bytes(max_bytes: Optional[int]) -> None:
+    """
+    Limit the memory the results of all cached functions together are allowed to use.
+    If the limit is exceeded, entries of the function cache which uses the most memory are evicted.
+    :param max_bytes: The byte budget or None to remove the limit
+    """
+    DataCache().set_max_bytes(max_bytes)
+
+
+def cache_stats() -> Dict[Callable, CacheStatistics]:
+    """
+    The hits, misses, evictions, expirations, size and miss latency of every cached function
+    """
+    return DataCache().statistics()
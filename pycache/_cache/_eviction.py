@@ -0,0 +1,222 @@
+from collections import OrderedDict
+from itertools import islice
+from typing import Hashable, Dict, Type, Union, List
+
+
+class EvictionPolicy:
+    """
+    Decides which entry of a FunctionCache has to make room for a new one.
+    Every operation of the shipped policies is O(1).
+    """
+    # Set to True if the policy has to see cache hits in on_access
+    tracks_access = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+
+    def on_miss(self, key: Hashable) -> None:
+        pass
+
+    def on_insert(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def on_access(self, key: Hashable) -> None:
+        pass
+
+    def on_remove(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def victim(self) -> Hashable:
+        raise NotImplementedError
+
+    def victims(self, count: int) -> List[Hashable]:
+        """
+        The next entries which would be evicted, the next victim first. Policies which can not tell return only it.
+        """
+        return [self.victim()]
+
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        return True
+
+
+class FIFOPolicy(EvictionPolicy):
+    """
+    Evict the entry which was inserted first
+    """
+
+    def __init__(self, max_entries: int):
+        super().__init__(max_entries)
+        self._order: OrderedDict = OrderedDict()
+
+    def on_insert(self, key: Hashable) -> None:
+        self._order[key] = None
+
+    def on_remove(self, key: Hashable) -> None:
+        del self._order[key]
+
+    def victim(self) -> Hashable:
+        return next(iter(self._order))
+
+    def victims(self, count: int) -> List[Hashable]:
+        return list(islice(self._order, count))
+
+
+class LRUPolicy(FIFOPolicy):
+    """
+    Evict the entry which was not accessed for the longest time
+    """
+    tracks_access = True
+
+    def on_access(self, key: Hashable) -> None:
+        self._order.move_to_end(key)
+
+
+class LFUPolicy(EvictionPolicy):
+    """
+    Evict the entry with the fewest accesses, the least recently used one on a tie
+    """
+    tracks_access = True
+
+    def __init__(self, max_entries: int):
+        super().__init__(max_entries)
+        self._frequencies: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, OrderedDict] = {}
+        # The frequencies which have a bucket are linked in ascending order, starting at 0. So the next smallest
+        # frequency is known without a search, once the bucket of the smallest one gets empty.
+        self._higher: Dict[int, int] = {}
+        self._lower: Dict[int, int] = {}
+
+    def on_insert(self, key: Hashable) -> None:
+        self._frequencies[key] = 1
+        self._link(key, 1, 0)
+
+    def on_access(self, key: Hashable) -> None:
+        frequency = self._frequencies[key]
+        self._frequencies[key] = frequency + 1
+        self._link(key, frequency + 1, frequency)
+        self._unlink(key, frequency)
+
+    def on_remove(self, key: Hashable) -> None:
+        self._unlink(key, self._frequencies.pop(key))
+
+    def victim(self) -> Hashable:
+        return next(iter(self._buckets[self._higher[0]]))
+
+    def victims(self, count: int) -> List[Hashable]:
+        victims = []
+        frequency = self._higher.get(0)
+        while frequency is not None and len(victims) < count:
+            victims += islice(self._buckets[frequency], count - len(victims))
+            frequency = self._higher.get(frequency)
+        return victims
+
+    def _link(self, key: Hashable, frequency: int, lower: int) -> None:
+        """
+        :param lower: A frequency with a bucket which is directly below the given one, or 0
+        """
+        bucket = self._buckets.get(frequency)
+        if bucket is None:
+            bucket = self._buckets[frequency] = OrderedDict()
+            higher = self._higher.get(lower)
+            self._higher[lower] = frequency
+            self._lower[frequency] = lower
+            if higher is not None:
+                self._higher[frequency] = higher
+                self._lower[higher] = frequency
+        bucket[key] = None
+
+    def _unlink(self, key: Hashable, frequency: int) -> None:
+        bucket = self._buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[frequency]
+            lower = self._lower.pop(frequency)
+            higher = self._higher.pop(frequency, None)
+            if higher is None:
+                del self._higher[lower]
+            else:
+                self._higher[lower] = higher
+                self._lower[higher] = lower
+
+
+class FrequencySketch:
+    """
+    Count-min sketch with 4 bit counters which approximates the access frequency of keys.
+    All counters get halved after a sample period, so that old popularity fades away.
+    """
+
+    _SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0x27D4EB2F165667C5)
+    _MAX_COUNT = 15
+
+    def __init__(self, capacity: int):
+        width = 16
+        while width < capacity:
+            width <<= 1
+
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in self._SEEDS]
+        self._sample_size = 10 * max(capacity, 1)
+        self._additions = 0
+
+    def _indexes(self, key: Hashable):
+        key_hash = hash(key) & 0xFFFFFFFFFFFFFFFF
+        return [(((key_hash * seed) & 0xFFFFFFFFFFFFFFFF) >> 32) & self._mask for seed in self._SEEDS]
+
+    def increment(self, key: Hashable) -> None:
+        for row, index in zip(self._rows, self._indexes(key)):
+            if row[index] < self._MAX_COUNT:
+                row[index] += 1
+
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._reset()
+
+    def frequency(self, key: Hashable) -> int:
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def _reset(self) -> None:
+        for row in self._rows:
+            for index in range(len(row)):
+                row[index] >>= 1
+        self._additions //= 2
+
+
+class TinyLFUPolicy(LRUPolicy):
+    """
+    LRU eviction with a TinyLFU admission filter.
+    A new entry only replaces the LRU victim if it was requested more often than the victim.
+    """
+
+    def __init__(self, max_entries: int):
+        super().__init__(max_entries)
+        self._sketch = FrequencySketch(max_entries)
+
+    def on_miss(self, key: Hashable) -> None:
+        self._sketch.increment(key)
+
+    def on_access(self, key: Hashable) -> None:
+        super().on_access(key)
+        self._sketch.increment(key)
+
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        return self._sketch.frequency(candidate) > self._sketch.frequency(victim)
+
+
+EVICTION_POLICIES: Dict[str, Type[EvictionPolicy]] = {
+    "fifo": FIFOPolicy,
+    "lru": LRUPolicy,
+    "lfu": LFUPolicy,
+    "tinylfu": TinyLFUPolicy,
+}
+
+
+def create_eviction_policy(eviction: Union[str, Type[EvictionPolicy]], max_entries: int) -> EvictionPolicy:
+    if isinstance(eviction, str):
+        if eviction.lower() not in EVICTION_POLICIES:
+            raise Exception(f"Unknown eviction policy {eviction}, use one of {', '.join(EVICTION_POLICIES)}")
+        eviction = EVICTION_POLICIES[eviction.lower()]
+
+    if not (isinstance(eviction, type) and issubclass(eviction, EvictionPolicy)):
+        raise Exception("The eviction policy has to be a name or a subclass of EvictionPolicy")
+
+    return eviction(max_entries)
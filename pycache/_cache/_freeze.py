@@ -0,0 +1,152 @@
+import hashlib
+import sys
+from typing import Any, Hashable
+
+# Marks the frozen representation of an unhashable value, so that it can not be equal to a regular argument
+_FROZEN = object()
+# Every element of a container counts with this many bytes against the hash budget
+_ELEMENT_BYTES = 8
+
+DEFAULT_MAX_HASH_BYTES = 16 * 1024 * 1024
+
+
+class UncacheableArguments(Exception):
+    """
+    Raised if the arguments contain more data than the hash budget allows
+    """
+
+
+class IdentityKey:
+    """
+    Stands in for an unhashable object which can not be compared by its content.
+    The key keeps the object alive, so that its id can not be reused by another object while the key is cached.
+    """
+    __slots__ = ("obj",)
+
+    def __init__(self, obj: Any):
+        self.obj = obj
+
+    def __hash__(self) -> int:
+        return id(self.obj)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, IdentityKey) and other.obj is self.obj
+
+    def __reduce__(self):
+        # The identity of an object is meaningless in another process, so the key must not be persisted
+        raise TypeError("An identity key can not be pickled")
+
+
+def _is_numpy_array(value: Any) -> bool:
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(value, numpy.ndarray)
+
+
+def _digest_array(array, hasher) -> None:
+    if array.size == 0:
+        # The shape and dtype are part of the key, an empty array has no data besides them
+        return
+
+    numpy = sys.modules["numpy"]
+    if not array.flags.c_contiguous:
+        if array.ndim > 1:
+            for sub_array in array:
+                _digest_array(sub_array, hasher)
+            return
+        array = numpy.ascontiguousarray(array)
+
+    # Hash a byte view of the array without copying it. Unlike the buffer of the array itself, this works for
+    # every dtype, for example datetime64.
+    hasher.update(array.reshape(-1).view(numpy.uint8))
+
+
+def identity_key(key: tuple) -> tuple:
+    """
+    Replace the unhashable values of a key with keys which compare them by identity
+    """
+    return tuple(value if _is_hashable(value) else IdentityKey(value) for value in key)
+
+
+def _is_hashable(value: Any) -> bool:
+    try:
+        hash(value)
+        return True
+    except TypeError:
+        return False
+
+
+def freeze_key(key: tuple, max_hash_bytes: int = DEFAULT_MAX_HASH_BYTES) -> tuple:
+    """
+    Replace the unhashable values of a key with a hashable representation of their content.
+    Lists, tuples, dicts, sets, bytearrays and dataclasses are frozen recursively, NumPy arrays are digested.
+    Other unhashable objects and containers which contain themselves are compared by identity.
+    :param max_hash_bytes: The maximal amount of data which is hashed, before UncacheableArguments is raised
+    """
+    budget = [max_hash_bytes]
+    # The ids of the containers which are frozen right now. Meeting one of them again means that it contains itself.
+    path = set()
+
+    def spend(size: int) -> None:
+        budget[0] -= size
+        if budget[0] < 0:
+            raise UncacheableArguments(f"The arguments contain more than {max_hash_bytes} bytes")
+
+    def freeze(value: Any) -> Hashable:
+        value_type = type(value)
+
+        if value_type is tuple:
+            spend(len(value) * _ELEMENT_BYTES)
+            return tuple(map(freeze, value))
+
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            pass
+
+        if id(value) in path:
+            # A cyclic container has no finite representation, so it is compared by identity
+            return IdentityKey(value)
+        path.add(id(value))
+        try:
+            return freeze_unhashable(value, value_type)
+        finally:
+            path.discard(id(value))
+
+    def freeze_unhashable(value: Any, value_type: type) -> Hashable:
+        if isinstance(value, (list, tuple)):
+            spend(len(value) * _ELEMENT_BYTES)
+            return _FROZEN, value_type, tuple(map(freeze, value))
+
+        if isinstance(value, dict):
+            spend(len(value) * 2 * _ELEMENT_BYTES)
+            return _FROZEN, value_type, frozenset((freeze(k), freeze(v)) for k, v in value.items())
+
+        if isinstance(value, (set, frozenset)):
+            spend(len(value) * _ELEMENT_BYTES)
+            return _FROZEN, value_type, frozenset(value)
+
+        if isinstance(value, bytearray):
+            spend(len(value))
+            return _FROZEN, value_type, bytes(value)
+
+        if _is_numpy_array(value):
+            if value.dtype.hasobject:
+                # The buffer only contains pointers to the objects
+                return _FROZEN, value_type, value.shape, freeze(value.tolist())
+
+            spend(value.nbytes)
+            hasher = hashlib.blake2b(digest_size=16)
+            _digest_array(value, hasher)
+            return _FROZEN, value_type, value.shape, value.dtype.str, hasher.digest()
+
+        if hasattr(value_type, "__dataclass_fields__"):
+            fields = sys.modules["dataclasses"].fields(value)
+            spend(len(fields) * _ELEMENT_BYTES)
+            return _FROZEN, value_type, tuple(
+                (field.name, freeze(getattr(value, field.name))) for field in fields if field.compare
+            )
+
+        return IdentityKey(value)
+
+    return tuple(map(freeze, key))
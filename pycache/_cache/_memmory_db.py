@@ -1,94 +1,623 @@
-from typing import Optional, Any, Dict, Callable, Hashable
+import random
+import threading
+from collections import ChainMap
+from heapq import heappush, heappop, heapify, nlargest
+from itertools import count, chain
+from operator import itemgetter
+from time import monotonic
+from typing import Any, Dict, Callable, Hashable, Type, Union, List, Tuple, Optional
 
-from pycache._cache._timer import Timer
-from pycache._shared._parser import ScheduleType
+from pycache._cache._eviction import EvictionPolicy, create_eviction_policy
+from pycache._cache._freeze import freeze_key, identity_key, DEFAULT_MAX_HASH_BYTES
+from pycache._cache._sizeof import deep_sizeof
+from pycache._cache._stats import CacheStats, CacheStatistics
+from pycache._shared._hooks import Hooks
+from pycache._shared._parser import Schedule
 from pycache._shared._singleton import Singleton
 
 
-class CacheEntry:
+# Returned by lookup if a key is not cached, because None can be a cached value
+MISSING = object()
+# How many of the entries the eviction policy would evict next are compared by their size, if bytes have to be freed
+_SIZE_SAMPLE = 5
+# How many function caches are compared by their size, if the global byte budget is exceeded
+_CACHE_SAMPLE = 5
+
+
+class ByteCounter:
+    """
+    The bytes of many function caches together. The caches add every change, so reading it does not depend on the
+    number of caches.
+    """
+
     def __init__(self):
-        self._value: Optional[Any] = None
-        self._timer = Timer()
-        self._was_set = False
+        self.value = 0
+        self._lock = threading.Lock()
 
-    @property
-    def value(self) -> Any:
-        return self._value
+    def add(self, size: int) -> None:
+        with self._lock:
+            self.value += size
 
-    @value.setter
-    def value(self, value):
-        self._was_set = True
-        self._value = value
-        self._timer.reset()
 
-    def is_valid(self) -> bool:
-        return self._was_set and not self._timer.has_expired()
+class CacheEntry:
+    """
+    A cached value and the monotonic time it expires at. The schedule is shared by the whole FunctionCache.
+    """
+    __slots__ = ("value", "deadline")
+
+    def __init__(self, value: Any, deadline: float):
+        self.value = value
+        self.deadline = deadline
 
-    def set_expiry(self, schedule_type: ScheduleType, schedule_str: str) -> None:
-        self._timer.set_schedule(schedule_type, schedule_str)
+    def is_valid(self) -> bool:
+        return monotonic() < self.deadline
 
 
 class FunctionCache:
-    def __init__(self, max_cache_entries: int):
+    """
+    The cached values of one function. Every change takes the lock, so that the expiry sweeper and the global byte
+    budget can change the cache from another thread. Reads do not take it.
+    """
+
+    def __init__(self, max_cache_entries: int, schedule: Schedule = None,
+                 eviction: Union[str, Type[EvictionPolicy]] = "fifo", stale_window: float = 0,
+                 max_bytes: int = None, sizeof: Callable[[Any], int] = None):
+        self.lock = threading.Lock()
         self.max_cache_entries = max_cache_entries
-        self.cache: Dict[int, CacheEntry] = {}
+        self.schedule = schedule
+        self.stale_window = stale_window
+        self.cache: Dict[Hashable, CacheEntry] = {}
+        self.eviction_policy = create_eviction_policy(eviction, max_cache_entries)
+        # FIFO does not need to see hits, so the hit path can skip the call
+        self._tracks_access = self.eviction_policy.tracks_access or \
+            type(self.eviction_policy).on_access is not EvictionPolicy.on_access
+        self._record_access = self.eviction_policy.on_access
 
-    def is_in_cache(self, key: int) -> bool:
-        return key in self.cache and self.cache[key].is_valid()
+        # The hits of every entry since it was stored and the arguments it was computed with, only if refresh ahead
+        # needs them
+        self.hit_counts: Optional[Dict[Hashable, int]] = None
+        self.arguments: Optional[Dict[Hashable, Tuple[tuple, dict]]] = None
 
-    def get_value_from_cache(self, key: int) -> Any:
-        if self.is_in_cache(key):
-            return self.cache[key].value
-        raise Exception("Value could not be found")
+        # The sizes of the values are only calculated if they are needed
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or deep_sizeof
+        self.current_bytes = 0
+        self._sizes: Optional[Dict[Hashable, int]] = {} if max_bytes is not None or sizeof else None
+        # The bytes of all function caches, which are kept up to date for the global byte budget
+        self._byte_counter: Optional[ByteCounter] = None
+
+        # Min heap of (time the entry can be freed, tie breaker, key). Records of overwritten or evicted entries
+        # are not removed from the heap, they are skipped when they are popped.
+        self._expiry_heap: List[Tuple[float, int, Hashable]] = []
+        self._expiry_counter = count()
+        self.stats = CacheStats()
+
+        # The cached function, which is passed to the evict and expire hooks
+        self.func: Optional[Callable] = None
+        self._hooks = Hooks()
+        self._evict_hooks = self._hooks.callbacks["evict"]
+        self._expire_hooks = self._hooks.callbacks["expire"]
+
+    @property
+    def size(self) -> int:
+        return len(self.cache)
+
+    def statistics(self) -> CacheStatistics:
+        return self.stats.snapshot(self.size, self.current_bytes)
+
+    def lookup(self, key: Hashable) -> Any:
+        """
+        Get a value with one dict lookup and one deadline comparison
+        :return: The value or MISSING if the key is not cached or expired
+        """
+        entry = self.cache.get(key)
+        if entry is not None and monotonic() < entry.deadline:
+            # Recording the access is best effort, so that a reader never waits for a writer
+            if self._tracks_access and self.lock.acquire(blocking=False):
+                try:
+                    if key in self.cache:
+                        self._record_access(key)
+                finally:
+                    self.lock.release()
+            return entry.value
+        return MISSING
+
+    def is_in_cache(self, key: Hashable) -> bool:
+        entry = self.cache.get(key)
+        return entry is not None and monotonic() < entry.deadline
+
+    def get_value_from_cache(self, key: Hashable) -> Any:
+        value = self.lookup(key)
+        if value is MISSING:
+            raise Exception("Value could not be found")
+        return value
+
+    def is_stale(self, key: Hashable) -> bool:
+        entry = self.cache.get(key)
+        return entry is not None and entry.deadline <= monotonic() < entry.deadline + self.stale_window
+
+    def lookup_stale(self, key: Hashable) -> Any:
+        """
+        :return: The value, if it is not older than the stale window, otherwise MISSING
+        """
+        entry = self.cache.get(key)
+        if entry is not None and monotonic() < entry.deadline + self.stale_window:
+            return entry.value
+        return MISSING
+
+    def get_stale_value_from_cache(self, key: Hashable) -> Any:
+        value = self.lookup_stale(key)
+        if value is MISSING:
+            raise Exception("Value could not be found")
+        return value
+
+    def track_hits(self) -> None:
+        """
+        Count the hits of every entry and remember the arguments of the entries, so that they can be recomputed
+        """
+        with self.lock:
+            if self.hit_counts is None:
+                self.hit_counts = {}
+                self.arguments = {}
+                self._tracks_access = True
+                self._record_access = self._count_hit
+
+    def _count_hit(self, key: Hashable) -> None:
+        self.eviction_policy.on_access(key)
+        self.hit_counts[key] = self.hit_counts.get(key, 0) + 1
+
+    def hot_keys(self, until: float, limit: int) -> List[Tuple[int, Hashable, float, Tuple[tuple, dict]]]:
+        """
+        The most hit entries, which are still valid and expire before the monotonic time until
+        :return: The hits, key, deadline and arguments of at most limit entries, the most hit first
+        """
+        if self.hit_counts is None:
+            return []
+
+        now = monotonic()
+        candidates = []
+        with self.lock:
+            for key, hits in self.hit_counts.items():
+                entry = self.cache.get(key)
+                arguments = self.arguments.get(key)
+                if entry is not None and arguments is not None and now < entry.deadline <= until:
+                    candidates.append((hits, key, entry.deadline, arguments))
+        return nlargest(limit, candidates, key=itemgetter(0))
+
+    def add_cache_entry(self, key: Hashable, value: Any, deadline: float = None,
+                        arguments: Tuple[tuple, dict] = None) -> None:
+        """
+        :param deadline: The monotonic time the entry expires at, defaults to the next deadline of the schedule
+        :param arguments: The positional and keyword arguments the value was computed with
+        """
+        if deadline is None:
+            deadline = self.schedule.next_monotonic_deadline() if self.schedule else float("inf")
+        size = self.sizeof(value) if self._sizes is not None else 0
+
+        with self.lock:
+            self._add_cache_entry(key, value, deadline, arguments, size)
+
+    def _add_cache_entry(self, key: Hashable, value: Any, deadline: float, arguments: Optional[Tuple[tuple, dict]],
+                         size: int) -> None:
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry.deadline <= monotonic():
+                self.stats.expired()
+                if self._expire_hooks:
+                    self._hooks.emit("expire", self.func, key)
+            if self._sizes is None:
+                self.eviction_policy.on_access(key)
+                entry.value = value
+                entry.deadline = deadline
+                self._push_expiry(key, deadline)
+                self._track_entry(key, arguments)
+                return
+            # The size of the value changes, so the new value has to make room like a new entry
+            self._remove_cache_entry(key)
+
+        if self.max_bytes is not None and size > self.max_bytes:
+            # A value which is larger than the whole budget would only flush the cache
+            return
+
+        self.eviction_policy.on_miss(key)
+
+        # Check if to many cache entries or bytes
+        while self.cache and (len(self.cache) >= self.max_cache_entries or
+                              (self.max_bytes is not None and self.current_bytes + size > self.max_bytes)):
+            if len(self.cache) >= self.max_cache_entries:
+                victim = self.eviction_policy.victim()
+            else:
+                victim = self._largest_victim()
+            if not self.eviction_policy.admit(key, victim):
+                return
+            self._remove_cache_entry(victim)
+            self.stats.evicted()
+            if self._evict_hooks:
+                self._hooks.emit("evict", self.func, victim)
+
+        self.cache[key] = CacheEntry(value, deadline)
+        self.eviction_policy.on_insert(key)
+        self._push_expiry(key, deadline)
+        self._track_entry(key, arguments)
+        if self._sizes is not None:
+            self._sizes[key] = size
+            self.current_bytes += size
+            if self._byte_counter is not None:
+                self._byte_counter.add(size)
+
+    def _track_entry(self, key: Hashable, arguments: Optional[Tuple[tuple, dict]]) -> None:
+        if self.hit_counts is not None:
+            # A new value has to become hot again
+            self.hit_counts.pop(key, None)
+            self.arguments[key] = arguments
+
+    def remove_cache_entry(self, key: Hashable) -> None:
+        with self.lock:
+            self._remove_cache_entry(key)
+
+    def _remove_cache_entry(self, key: Hashable) -> None:
+        del self.cache[key]
+        self.eviction_policy.on_remove(key)
+        if self._sizes is not None:
+            size = self._sizes.pop(key)
+            self.current_bytes -= size
+            if self._byte_counter is not None:
+                self._byte_counter.add(-size)
+        if self.hit_counts is not None:
+            self.hit_counts.pop(key, None)
+            self.arguments.pop(key, None)
+
+    def evict(self) -> int:
+        """
+        Remove the entry the eviction policy chooses
+        :return: The number of bytes which were freed
+        """
+        with self.lock:
+            if not self.cache:
+                return 0
+
+            victim = self._largest_victim() if self._sizes is not None else self.eviction_policy.victim()
+            freed = self._sizes[victim] if self._sizes is not None else 0
+            self._remove_cache_entry(victim)
+            self.stats.evicted()
+            if self._evict_hooks:
+                self._hooks.emit("evict", self.func, victim)
+            return freed
+
+    def track_bytes(self) -> None:
+        """
+        Start calculating the size of the values, if this is not already done
+        """
+        with self.lock:
+            if self._sizes is None:
+                self._sizes = {key: self.sizeof(entry.value) for key, entry in self.cache.items()}
+                self.current_bytes = sum(self._sizes.values())
+                if self._byte_counter is not None:
+                    self._byte_counter.add(self.current_bytes)
+
+    def set_byte_counter(self, byte_counter: Optional[ByteCounter]) -> None:
+        """
+        Add the bytes of this cache to the counter from now on
+        :param byte_counter: The counter or None to remove the bytes from the last counter
+        """
+        with self.lock:
+            if self._byte_counter is not None:
+                self._byte_counter.add(-self.current_bytes)
+            self._byte_counter = byte_counter
+            if byte_counter is not None:
+                byte_counter.add(self.current_bytes)
+
+    def _largest_victim(self) -> Hashable:
+        """
+        The largest of the entries the eviction policy would evict next, so that a large value does not push out
+        many small ones. A tie goes to the one the policy would evict first.
+        """
+        return max(self.eviction_policy.victims(_SIZE_SAMPLE), key=self._sizes.__getitem__)
+
+    def purge_expired(self) -> int:
+        """
+        Remove all entries which are expired (and not in the stale window any more) in O(log n) per entry
+        :return: The number of removed entries
+        """
+        now = monotonic()
+        removed = 0
+
+        with self.lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                _, _, key = heappop(heap)
+                entry = self.cache.get(key)
+                # Skip the record if the entry was overwritten with a new deadline in the meantime
+                if entry is not None and entry.deadline + self.stale_window <= now:
+                    self._remove_cache_entry(key)
+                    removed += 1
+                    if self._expire_hooks:
+                        self._hooks.emit("expire", self.func, key)
+        if removed:
+            self.stats.expired(removed)
+        return removed
+
+    def _push_expiry(self, key: Hashable, deadline: float) -> None:
+        if deadline == float("inf"):
+            return
 
-    def add_cache_entry(self, key: int, value: Any, schedule_type: ScheduleType, schedule_str: str) -> None:
-        if key not in self.cache:
+        heappush(self._expiry_heap, (deadline + self.stale_window, next(self._expiry_counter), key))
+        # Drop the outdated records once they outnumber the live ones, which keeps the heap O(n)
+        if len(self._expiry_heap) > 2 * len(self.cache) + 64:
+            self._expiry_heap = [
+                (entry.deadline + self.stale_window, next(self._expiry_counter), entry_key)
+                for entry_key, entry in self.cache.items() if entry.deadline != float("inf")
+            ]
+            heapify(self._expiry_heap)
 
-            # Check if to many cache entries
-            key_list = list(self.cache.keys())
-            if len(key_list) >= self.max_cache_entries:
-                del self.cache[key_list[0]]
 
-            self.cache[key] = CacheEntry()
-            self.cache[key].set_expiry(schedule_type, schedule_str)
-        self.cache[key].value = value
+class SegmentedFunctionCache:
+    """
+    A FunctionCache for many threads, which is split into segments with their own lock.
+    Reads do not take a lock and writes only lock the segment the key belongs to.
+    """
+
+    def __init__(self, max_cache_entries: int, schedule: Schedule = None,
+                 eviction: Union[str, Type[EvictionPolicy]] = "fifo", stale_window: float = 0,
+                 max_bytes: int = None, sizeof: Callable[[Any], int] = None, segments: int = 16):
+        if segments < 1:
+            raise Exception("A cache needs at least one segment")
+
+        segments = min(segments, max_cache_entries)
+        self.max_cache_entries = max_cache_entries
+        self.schedule = schedule
+        self.stale_window = stale_window
+        self.max_bytes = max_bytes
+        self.segments = [
+            # Every segment can use the whole byte budget, so that large values fit. The budget is enforced over
+            # all segments after every insert.
+            FunctionCache(max_cache_entries // segments + (index < max_cache_entries % segments), schedule, eviction,
+                          stale_window, max_bytes, sizeof)
+            for index in range(segments)
+        ]
+
+        # The counters are per thread, so the segments can share them without a lock
+        self.stats = CacheStats()
+        for segment in self.segments:
+            segment.stats = self.stats
+
+    @property
+    def func(self) -> Optional[Callable]:
+        return self.segments[0].func
+
+    @func.setter
+    def func(self, func: Callable) -> None:
+        for segment in self.segments:
+            segment.func = func
+
+    @property
+    def cache(self) -> ChainMap:
+        return ChainMap(*(segment.cache for segment in self.segments))
+
+    @property
+    def current_bytes(self) -> int:
+        return sum(segment.current_bytes for segment in self.segments)
+
+    @property
+    def size(self) -> int:
+        return sum(segment.size for segment in self.segments)
+
+    def statistics(self) -> CacheStatistics:
+        return self.stats.snapshot(self.size, self.current_bytes)
+
+    def is_in_cache(self, key: Hashable) -> bool:
+        return self.segments[hash(key) % len(self.segments)].is_in_cache(key)
+
+    def lookup(self, key: Hashable) -> Any:
+        """
+        Get a value without a lock. The entry is read once, so a concurrent eviction can not remove it
+        between the check and the read.
+        :return: The value or MISSING if the key is not cached or expired
+        """
+        return self.segments[hash(key) % len(self.segments)].lookup(key)
+
+    def get_value_from_cache(self, key: Hashable) -> Any:
+        value = self.lookup(key)
+        if value is MISSING:
+            raise Exception("Value could not be found")
+        return value
+
+    def is_stale(self, key: Hashable) -> bool:
+        return self.segments[hash(key) % len(self.segments)].is_stale(key)
+
+    def lookup_stale(self, key: Hashable) -> Any:
+        return self.segments[hash(key) % len(self.segments)].lookup_stale(key)
+
+    def get_stale_value_from_cache(self, key: Hashable) -> Any:
+        return self.segments[hash(key) % len(self.segments)].get_stale_value_from_cache(key)
+
+    def track_hits(self) -> None:
+        for segment in self.segments:
+            segment.track_hits()
+
+    def hot_keys(self, until: float, limit: int) -> List[Tuple[int, Hashable, float, Tuple[tuple, dict]]]:
+        hot_keys = []
+        for segment in self.segments:
+            hot_keys += segment.hot_keys(until, limit)
+        return nlargest(limit, hot_keys, key=itemgetter(0))
+
+    def add_cache_entry(self, key: Hashable, value: Any, deadline: float = None,
+                        arguments: Tuple[tuple, dict] = None) -> None:
+        self.segments[hash(key) % len(self.segments)].add_cache_entry(key, value, deadline, arguments)
+
+        if self.max_bytes is not None:
+            while self.current_bytes > self.max_bytes and self.evict():
+                pass
+
+    def remove_cache_entry(self, key: Hashable) -> None:
+        self.segments[hash(key) % len(self.segments)].remove_cache_entry(key)
+
+    def purge_expired(self) -> int:
+        return sum(segment.purge_expired() for segment in self.segments)
+
+    def evict(self) -> int:
+        return max(self.segments, key=lambda segment: segment.current_bytes).evict()
+
+    def track_bytes(self) -> None:
+        for segment in self.segments:
+            segment.track_bytes()
+
+    def set_byte_counter(self, byte_counter: Optional[ByteCounter]) -> None:
+        for segment in self.segments:
+            segment.set_byte_counter(byte_counter)
+
+
+# Separates the positional from the keyword arguments in a key
+_KWARGS_MARK = (object(),)
+# Only equal to values of the same type, unlike int which is equal to float and bool
+_FAST_TYPES = {str, bytes}
+# Keys with at least this many elements remember their hash
+_HASHED_KEY_LENGTH = 16
+
+
+class HashedKey(list):
+    """
+    The arguments of a call, which remember their hash, so that it is only calculated once per call.
+    The dict lookup compares the arguments, so keys with the same hash do not share a cache entry.
+    """
+    __slots__ = ("hash_value",)
+
+    def __init__(self, key: tuple, hash_value: int):
+        super().__init__(key)
+        self.hash_value = hash_value
+
+    def __hash__(self) -> int:
+        return self.hash_value
 
 
 class DataCache(metaclass=Singleton):
 
     def __init__(self):
-        self.cache: Dict[Callable, FunctionCache] = {}
+        self.cache: Dict[Callable, Union[FunctionCache, SegmentedFunctionCache]] = {}
+        self.max_bytes: Optional[int] = None
+        self.byte_counter = ByteCounter()
+        # The function caches in a list as well, so that the global byte budget can sample them in O(1)
+        self._caches: List[Union[FunctionCache, SegmentedFunctionCache]] = []
+        self._positions: Dict[Callable, int] = {}
+        self._lock = threading.Lock()
 
     @staticmethod
-    def hash_args(args: tuple, kwargs: Dict[str, Any]) -> int:
-        hash_key = ()
-        for value in args:
-            if isinstance(value, Hashable):
-                hash_key += (value,)
-            else:
-                hash_key += (id(value),)
+    def hash_args(args: tuple, kwargs: Dict[str, Any], typed: bool = False, hash_by_content: bool = False,
+                  max_hash_bytes: int = DEFAULT_MAX_HASH_BYTES) -> Hashable:
+        """
+        Build the cache key of the arguments of a function call.
+        The key contains the arguments themselves, so that calls with colliding hashes do not share an entry.
+        :param typed: Arguments of different types are cached separately, for example 3 and 3.0
+        :param hash_by_content: Compare unhashable arguments by their content instead of their identity
+        :param max_hash_bytes: How much data of unhashable arguments is hashed at most.
+                               Raises UncacheableArguments if there is more.
+        """
+        if not kwargs and not typed and len(args) == 1 and type(args[0]) in _FAST_TYPES:
+            # A single string can not be confused with the key of another call, so it does not need a wrapper
+            return args[0]
 
-        for key in (sorted(kwargs.keys())):
-            value = kwargs[key]
+        key = args
+        if kwargs:
+            # The order of the keyword arguments does not matter
+            items = sorted(kwargs.items()) if len(kwargs) > 1 else tuple(kwargs.items())
+            key += _KWARGS_MARK + tuple(chain.from_iterable(items))
+            if typed:
+                key += tuple(map(type, args)) + tuple(type(value) for _, value in items)
+        elif typed:
+            key += tuple(map(type, args))
 
-            if isinstance(value, Hashable):
-                hash_key += (key, value,)
-            else:
-                hash_key += (key, id(value),)
+        try:
+            hash_value = hash(key)
+        except TypeError:
+            # At least one argument is not hashable, so it is replaced with a hashable stand in
+            key = freeze_key(key, max_hash_bytes) if hash_by_content else identity_key(key)
+            hash_value = hash(key)
 
-        return hash(hash_key)
+        if len(key) < _HASHED_KEY_LENGTH:
+            # Hashing a short tuple again for every dict operation is cheaper than creating the wrapper
+            return key
+        return HashedKey(key, hash_value)
 
-    def is_in_cache(self, key: int, func: Callable) -> bool:
+    def is_in_cache(self, key: Hashable, func: Callable) -> bool:
         return func in self.cache and \
                self.cache[func].is_in_cache(key)
 
-    def get_value_from_cache(self, key: int, func: Callable) -> Any:
+    def get_value_from_cache(self, key: Hashable, func: Callable) -> Any:
         if self.is_in_cache(key, func):
             return self.cache[func].get_value_from_cache(key)
         raise Exception("Value could not be found")
 
-    def add_function_cache(self, func: Callable, function_cache: FunctionCache) -> None:
-        if func not in self.cache:
+    def purge_expired(self) -> int:
+        """
+        Remove the expired entries of all function caches
+        :return: The number of removed entries
+        """
+        return sum(function_cache.purge_expired() for function_cache in list(self.cache.values()))
+
+    @property
+    def current_bytes(self) -> int:
+        return self.byte_counter.value
+
+    def statistics(self) -> Dict[Callable, CacheStatistics]:
+        """
+        :return: The statistics of every cached function
+        """
+        return {func: function_cache.statistics() for func, function_cache in list(self.cache.items())}
+
+    def set_max_bytes(self, max_bytes: Optional[int]) -> None:
+        """
+        Limit the memory all function caches together are allowed to use
+        :param max_bytes: The byte budget or None to remove the limit
+        """
+        self.max_bytes = max_bytes
+        if max_bytes is not None:
+            for function_cache in list(self.cache.values()):
+                function_cache.track_bytes()
+            self.enforce_max_bytes()
+
+    def enforce_max_bytes(self, function_cache: Union[FunctionCache, SegmentedFunctionCache] = None) -> None:
+        """
+        Evict entries until the global byte budget is kept. The entries are evicted in the largest of a few random
+        function caches and the given one, so the work does not depend on the number of function caches.
+        :param function_cache: The function cache which just stored a value
+        """
+        while self.max_bytes is not None and self.byte_counter.value > self.max_bytes:
+            with self._lock:
+                caches = self._caches
+                candidates = [caches[random.randrange(len(caches))] for _ in range(min(_CACHE_SAMPLE, len(caches)))]
+            if function_cache is not None:
+                candidates.append(function_cache)
+            if not candidates:
+                break
+            if not max(candidates, key=lambda candidate: candidate.current_bytes).evict():
+                # The sampled caches are empty, which is rare, so all of them are searched
+                largest = max(list(self.cache.values()), key=lambda candidate: candidate.current_bytes, default=None)
+                if largest is None or not largest.evict():
+                    break
+
+    def add_function_cache(self, func: Callable,
+                           function_cache: Union[FunctionCache, SegmentedFunctionCache]) -> None:
+        with self._lock:
+            if func in self.cache:
+                raise Exception("Function is already in cache")
+            function_cache.func = func
             self.cache[func] = function_cache
-        else:
-            raise Exception("Function is already in cache")
+            self._positions[func] = len(self._caches)
+            self._caches.append(function_cache)
+        if self.max_bytes is not None:
+            function_cache.track_bytes()
+        function_cache.set_byte_counter(self.byte_counter)
+
+    def remove_function_cache(self, func: Callable) -> None:
+        with self._lock:
+            function_cache = self.cache.pop(func, None)
+            if function_cache is None:
+                return
+
+            # Move the last cache into the gap, so that removing is O(1)
+            position = self._positions.pop(func)
+            last = self._caches.pop()
+            if last is not function_cache:
+                self._caches[position] = last
+                self._positions[last.func] = position
+        function_cache.set_byte_counter(None)
@@ -0,0 +1,109 @@
+import asyncio
+import functools
+import threading
+import weakref
+from types import MethodType
+from typing import Callable, Dict, Tuple, Any
+
+from ._cache import cache
+from ._memmory_db import DataCache
+
+
+class CachedMethod:
+    """
+    A method with a separate cache for every instance. The cache of an instance is removed once the instance is
+    garbage collected, so the memory scales with the live instances and an instance never sees the results of
+    another one. The instance is not part of the cache key.
+    """
+
+    def __init__(self, func: Callable, decorator: Callable[[Callable], Callable]):
+        self._func = func
+        self._decorator = decorator
+        # Maps the id of an instance to a weak reference to it, the method which is returned for it and the
+        # function which is registered in the DataCache.
+        # Unlike a WeakKeyDictionary this also works for unhashable instances and does not share the cache of
+        # instances which are equal.
+        self._caches: Dict[int, Tuple[weakref.ref, Callable, Callable]] = {}
+        self._lock = threading.Lock()
+        functools.update_wrapper(self, func)
+
+    def __get__(self, instance: Any, owner: type = None):
+        if instance is None:
+            return self
+
+        cached = self._caches.get(id(instance))
+        if cached is None or cached[0]() is not instance:
+            cached = self._create(instance)
+        # The bound method keeps the instance alive while it is called
+        return MethodType(cached[1], instance)
+
+    def _create(self, instance: Any) -> Tuple[weakref.ref, Callable, Callable]:
+        with self._lock:
+            cached = self._caches.get(id(instance))
+            if cached is not None and cached[0]() is instance:
+                return cached
+
+            try:
+                instance_ref = weakref.ref(instance, functools.partial(self._remove, id(instance)))
+            except TypeError:
+                raise Exception(f"A cached method needs instances which support weak references, "
+                                f"add __weakref__ to the __slots__ of {type(instance).__name__}")
+
+            func = self._func
+            if asyncio.iscoroutinefunction(func):
+                async def bound(*args, **kwargs):
+                    return await func(_dereference(instance_ref), *args, **kwargs)
+
+                cached_function = self._decorator(functools.wraps(func)(bound))
+
+                async def call(_instance, *args, **kwargs):
+                    return await cached_function(*args, **kwargs)
+            else:
+                def bound(*args, **kwargs):
+                    return func(_dereference(instance_ref), *args, **kwargs)
+
+                cached_function = self._decorator(functools.wraps(func)(bound))
+
+                def call(_instance, *args, **kwargs):
+                    return cached_function(*args, **kwargs)
+
+            # Bound methods forward attribute access to the function, so instance.method.cache_info() works
+            functools.update_wrapper(call, cached_function)
+            cached = self._caches[id(instance)] = (instance_ref, call, bound)
+            return cached
+
+    def _remove(self, instance_id: int, instance_ref: weakref.ref) -> None:
+        # Called by the garbage collector, so it must not wait for the lock
+        cached = self._caches.get(instance_id)
+        if cached is not None and cached[0] is instance_ref:
+            del self._caches[instance_id]
+            DataCache().remove_function_cache(cached[2])
+
+    def __call__(self, instance: Any, *args, **kwargs):
+        # Allows Class.method(instance, ...)
+        return self.__get__(instance, type(instance))(*args, **kwargs)
+
+
+def _dereference(instance_ref: weakref.ref) -> Any:
+    instance = instance_ref()
+    if instance is None:
+        # Only possible for a background refresh, which outlived its instance
+        raise ReferenceError("The instance of the cached method was garbage collected")
+    return instance
+
+
+def cached_method(expires_every: str = None, expires_at: str = None, **kwargs) -> Callable[[Callable], CachedMethod]:
+    """
+    Cache the results of a method separately for every instance. Takes the same arguments as cache,
+    except for backend, because instances are not shared between processes.
+    """
+    if kwargs.get("backend") is not None:
+        raise Exception("A cached method can not use a backend")
+
+    # The schedule is parsed once for all instances
+    decorator = cache(expires_every, expires_at, **kwargs)
+
+    def method_wrapper(func: Callable) -> CachedMethod:
+        return CachedMethod(func, decorator)
+
+    return method_wrapper
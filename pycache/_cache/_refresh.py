@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import traceback
+from collections import deque
+from time import monotonic
+from typing import Callable, Union, Optional
+
+from pycache._cache._memmory_db import DataCache, FunctionCache, SegmentedFunctionCache
+from pycache._scheduler._async_engine import AsyncScheduler
+from pycache._scheduler._background import BackgroundRunner
+from pycache._scheduler._engine import SchedulerEngine
+
+
+class RefreshAhead:
+    """
+    Recomputes the most hit entries of a function cache shortly before they expire, so that the calls after a
+    deadline are not all misses at once.
+    The scheduler engine fires it twice per window and every fire refreshes the entries which expire within the next
+    window, so every entry is refreshed between one and a half window before its deadline.
+    Coroutine functions are refreshed as tasks in the event loop they were called in.
+    """
+
+    def __init__(self, func_cache: Union[FunctionCache, SegmentedFunctionCache], window: float, keys: int,
+                 concurrency: int, refresh: Callable):
+        """
+        :param window: How many seconds before their deadline the entries are refreshed
+        :param keys: How many of the most hit entries are refreshed per window
+        :param concurrency: How many entries are refreshed at the same time
+        :param refresh: Called with the key, args, kwargs and deadline of an entry, can be a coroutine function
+        """
+        self._func_cache = func_cache
+        self._window = window
+        self._keys = keys
+        self._concurrency = concurrency
+        self._refresh = refresh
+        self._is_async = asyncio.iscoroutinefunction(refresh)
+
+        self._generation = 0
+        self._running = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._engine: Union[SchedulerEngine, AsyncScheduler, None] = None
+        self._lock = threading.Lock()
+        func_cache.track_hits()
+
+    def start(self) -> None:
+        """
+        Start refreshing, if it is not running yet. Called for every stored value.
+        """
+        loop = asyncio.get_event_loop() if self._is_async else None
+        if self._running and loop is self._loop:
+            return
+
+        with self._lock:
+            if self._running and loop is self._loop:
+                return
+            # Coroutine functions move to the loop they are called in now
+            self._loop = loop
+            self._engine = AsyncScheduler.for_loop(loop) if self._is_async else SchedulerEngine()
+            self._running = True
+            self._generation += 1
+            self._add_to_engine()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._running = False
+            self._generation += 1
+            self._engine.remove(self)
+
+    def _add_to_engine(self) -> None:
+        deadline = monotonic() + self._window / 2
+        if self._is_async:
+            self._engine.add(self, deadline)
+        else:
+            # A cache must not keep the interpreter alive
+            self._engine.add(self, deadline, daemon=True)
+
+    def _fire(self) -> None:
+        """
+        Called by the engine once half of the window passed
+        """
+        if DataCache().cache.get(self._func_cache.func) is not self._func_cache:
+            # The function cache was removed, for example with the instance of a cached method
+            self.stop()
+            return
+
+        generation = self._generation
+        jobs = deque(self._func_cache.hot_keys(monotonic() + self._window, self._keys))
+        for _ in range(min(self._concurrency, len(jobs))):
+            if self._is_async:
+                BackgroundRunner().create_task(self._async_worker(jobs))
+            else:
+                BackgroundRunner().submit(self._worker, jobs)
+
+        with self._lock:
+            if self._running and generation == self._generation:
+                self._add_to_engine()
+
+    def _worker(self, jobs: deque) -> None:
+        while jobs:
+            try:
+                _, key, deadline, (args, kwargs) = jobs.popleft()
+            except IndexError:
+                return
+            try:
+                self._refresh(key, args, kwargs, deadline)
+            except Exception:
+                # The old value stays until its deadline, so a failed refresh only costs the miss it should prevent
+                traceback.print_exc()
+
+    async def _async_worker(self, jobs: deque) -> None:
+        while jobs:
+            _, key, deadline, (args, kwargs) = jobs.popleft()
+            try:
+                await self._refresh(key, args, kwargs, deadline)
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    __slots__ = ("event", "result", "exception")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.exception: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Make sure that a function runs only once per key, even if many threads request the key at the same time.
+    All threads which arrive while the function runs wait for its result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.event.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as ex:
+            call.exception = ex
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """
+    The asyncio version of SingleFlight. The function runs in its own task per key, which all callers await.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = {}
+
+    async def do(self, key: Hashable, coroutine_function: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_event_loop()
+        flight_key = (loop, key)
+
+        task = self._tasks.get(flight_key)
+        if task is None:
+            # The first caller does not run the function itself, so that cancelling it does not cancel the others
+            task = loop.create_task(self._run(flight_key, coroutine_function, args, kwargs))
+            # Mark the exception as retrieved, even if all callers were cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._tasks[flight_key] = task
+
+        # Shield the shared task, so that a cancelled caller does not cancel it
+        return await asyncio.shield(task)
+
+    async def _run(self, flight_key: Tuple[asyncio.AbstractEventLoop, Hashable], coroutine_function: Callable,
+                   args: tuple, kwargs: dict) -> Any:
+        try:
+            return await coroutine_function(*args, **kwargs)
+        finally:
+            del self._tasks[flight_key]
@@ -0,0 +1,46 @@
+import sys
+from collections import deque
+from types import ModuleType, FunctionType, BuiltinFunctionType, MethodType
+from typing import Any
+
+# Objects which do not reference other objects
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None), range, memoryview)
+# Objects which are shared by the whole program and do not belong to a cached value
+_SHARED_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+
+
+def deep_sizeof(obj: Any) -> int:
+    """
+    Estimate the memory an object uses, including the objects it references.
+    Objects which are referenced multiple times are only counted once.
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SHARED_TYPES):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+
+        if isinstance(current, _ATOMIC_TYPES):
+            continue
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+
+        if hasattr(current, "__dict__"):
+            stack.append(current.__dict__)
+
+        for cls in type(current).__mro__:
+            slots = cls.__dict__.get("__slots__", ())
+            for slot in ((slots,) if isinstance(slots, str) else slots):
+                if slot not in ("__dict__", "__weakref__") and hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+
+    return size
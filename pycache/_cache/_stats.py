@@ -0,0 +1,130 @@
+import threading
+import weakref
+from typing import NamedTuple, Dict
+
+_HITS = 0
+_MISSES = 1
+_EVICTIONS = 2
+_EXPIRATIONS = 3
+_MISS_TIME = 4
+_BUCKETS = 5
+# Bucket i counts the misses which took less than 2 ** i microseconds, the last bucket the slower ones
+_BUCKET_COUNT = 25
+
+
+class CacheInfo(NamedTuple):
+    """
+    The same fields as the cache info of functools.lru_cache
+    """
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class CacheStatistics(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    size: int
+    bytes: int
+    # The total time of all misses in seconds
+    miss_time: float
+    # Maps the upper bound of a latency bucket in seconds to the number of misses in the bucket
+    miss_latency: Dict[float, int]
+
+    @property
+    def hit_rate(self) -> float:
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0.0
+
+
+class _ThreadAlive:
+    """
+    Lives as long as the thread local attributes of one thread, which are released when the thread ends
+    """
+    __slots__ = ("__weakref__",)
+
+
+class _Counters(threading.local):
+    def __init__(self, registry: Dict[int, list], base: list, lock: threading.Lock):
+        # Called once in every thread, which accesses the counters
+        self.values = _empty_counts()
+        with lock:
+            registry[id(self.values)] = self.values
+        # Once the thread ended, its counts are moved to the base counts, so that the registry does not grow with
+        # every thread which ever used the cache
+        self.alive = _ThreadAlive()
+        weakref.finalize(self.alive, _fold, self.values, registry, base, lock).atexit = False
+
+
+def _fold(values: list, registry: Dict[int, list], base: list, lock: threading.Lock) -> None:
+    with lock:
+        del registry[id(values)]
+        for index, value in enumerate(values):
+            base[index] += value
+
+
+class CacheStats:
+    """
+    Counts what happens in one function cache.
+    Every thread increments its own counters without a lock, they are only summed up when the statistics are read.
+    """
+
+    def __init__(self):
+        self._registry: Dict[int, list] = {}
+        # The counts of the threads which ended
+        self._base = _empty_counts()
+        self._lock = threading.Lock()
+        self._counters = _Counters(self._registry, self._base, self._lock)
+
+    def hit(self) -> None:
+        self._counters.values[_HITS] += 1
+
+    def miss(self, latency: float) -> None:
+        values = self._counters.values
+        values[_MISSES] += 1
+        values[_MISS_TIME] += latency
+        values[_BUCKETS + min(int(latency * 1_000_000).bit_length(), _BUCKET_COUNT - 1)] += 1
+
+    def evicted(self) -> None:
+        self._counters.values[_EVICTIONS] += 1
+
+    def expired(self, count: int = 1) -> None:
+        self._counters.values[_EXPIRATIONS] += count
+
+    def totals(self) -> list:
+        with self._lock:
+            registry = [self._base, *self._registry.values()]
+        return [sum(values) for values in zip(*registry)]
+
+    def snapshot(self, size: int, size_in_bytes: int) -> CacheStatistics:
+        totals = self.totals()
+        return CacheStatistics(
+            hits=totals[_HITS],
+            misses=totals[_MISSES],
+            evictions=totals[_EVICTIONS],
+            expirations=totals[_EXPIRATIONS],
+            size=size,
+            bytes=size_in_bytes,
+            miss_time=totals[_MISS_TIME],
+            miss_latency={
+                _upper_bound(bucket): count for bucket, count in enumerate(totals[_BUCKETS:]) if count
+            },
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            for values in (self._base, *self._registry.values()):
+                values[:] = _empty_counts()
+
+
+def _empty_counts() -> list:
+    counts = [0] * (_BUCKETS + _BUCKET_COUNT)
+    counts[_MISS_TIME] = 0.0
+    return counts
+
+
+def _upper_bound(bucket: int) -> float:
+    return float("inf") if bucket == _BUCKET_COUNT - 1 else 2 ** bucket / 1_000_000
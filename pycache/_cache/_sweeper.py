@@ -0,0 +1,21 @@
+from pycache._cache._memmory_db import DataCache
+from pycache._scheduler._scheduler import add_schedule, ScheduleSubscription
+
+
+def purge_expired() -> int:
+    """
+    Remove the expired entries of every cached function
+    :return: The number of removed entries
+    """
+    return DataCache().purge_expired()
+
+
+def start_expiry_sweeper(call_every: str = "*:*:1") -> ScheduleSubscription:
+    """
+    Free expired cache entries in the background, so that they do not keep their values in memory
+    until they get overwritten or evicted. The sweeper takes the lock of every cache it changes, so the cached
+    functions can be called while it runs.
+    :param call_every: A string which specifies every how many hours/minutes/seconds (hh:mm:ss) the caches are swept
+    :return: The subscription of the sweeper, which can be used to stop it
+    """
+    return add_schedule(purge_expired, call_every=call_every)
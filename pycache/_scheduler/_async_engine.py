@@ -0,0 +1,78 @@
+import asyncio
+from asyncio import AbstractEventLoop
+from time import monotonic
+from typing import Dict, Any, Set, Awaitable
+
+
+class AsyncScheduler:
+    """
+    Fires schedule subscriptions inside an event loop with loop.call_at, so that no thread is needed.
+    Coroutine jobs run as tasks on the loop. There is one scheduler per event loop.
+    """
+    _schedulers: Dict[AbstractEventLoop, "AsyncScheduler"] = {}
+
+    def __init__(self, loop: AbstractEventLoop):
+        self._loop = loop
+        self._handles: Dict[Any, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Future] = set()
+
+    @classmethod
+    def for_loop(cls, loop: AbstractEventLoop) -> "AsyncScheduler":
+        scheduler = cls._schedulers.get(loop)
+        if scheduler is None:
+            # A scheduler references its loop, so the schedulers of closed loops have to be dropped explicitly
+            for closed_loop in [other for other in cls._schedulers if other.is_closed()]:
+                del cls._schedulers[closed_loop]
+            scheduler = cls._schedulers[loop] = cls(loop)
+        return scheduler
+
+    def add(self, subscription, deadline: float) -> None:
+        """
+        Fire the subscription at the monotonic deadline. Can be called from any thread.
+        """
+        self._call_in_loop(self._add, subscription, deadline, subscription._generation)
+
+    def remove(self, subscription) -> None:
+        self._call_in_loop(self._remove, subscription)
+
+    def run(self, coroutine: Awaitable) -> asyncio.Future:
+        """
+        Run a job as task on the loop. Has to be called in the thread of the loop.
+        """
+        task = self._loop.create_task(coroutine)
+        # Keep a reference until the task is done, otherwise it could be garbage collected while it runs
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _call_in_loop(self, callback, *args) -> None:
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The loop is already closed, so nothing can be fired anymore
+            pass
+
+    def _add(self, subscription, deadline: float, generation: int) -> None:
+        self._remove(subscription)
+        # The default loop clock is monotonic as well, but it is not guaranteed to have the same origin
+        when = self._loop.time() + (deadline - monotonic())
+        self._handles[subscription] = self._loop.call_at(when, self._fire, subscription, generation)
+
+    def _remove(self, subscription) -> None:
+        handle = self._handles.pop(subscription, None)
+        if handle is not None:
+            handle.cancel()
+
+    def _fire(self, subscription, generation: int) -> None:
+        self._handles.pop(subscription, None)
+        if subscription._generation == generation:
+            subscription._fire()
+
+    def _task_done(self, task: asyncio.Future) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self._loop.call_exception_handler({
+                "message": "Exception in scheduled job",
+                "exception": task.exception(),
+                "future": task,
+            })
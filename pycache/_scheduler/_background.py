@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Set, Awaitable, Union
+
+from pycache._shared._singleton import Singleton
+
+
+class BackgroundRunner(metaclass=Singleton):
+    """
+    Runs one off jobs outside of the caller. Sync functions are run in a shared thread pool,
+    coroutines as a task on the event loop of the caller.
+    Nobody waits for the jobs, so the traceback of a failed job is printed.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self._max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._tasks: Set[asyncio.Future] = set()
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self._max_workers, thread_name_prefix="pycache")
+        future = self._executor.submit(func, *args, **kwargs)
+        future.add_done_callback(self._job_done)
+        return future
+
+    def create_task(self, coroutine: Awaitable) -> asyncio.Future:
+        task = asyncio.ensure_future(coroutine)
+        # Keep a reference until the task is done, otherwise it could be garbage collected while it runs
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Future) -> None:
+        self._tasks.discard(task)
+        self._job_done(task)
+
+    @staticmethod
+    def _job_done(future: Union[Future, asyncio.Future]) -> None:
+        # Retrieving the exception also prevents the "exception was never retrieved" warning of asyncio
+        exception = None if future.cancelled() else future.exception()
+        if exception is not None:
+            traceback.print_exception(type(exception), exception, exception.__traceback__)
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from heapq import heappush, heappop
+from itertools import count
+from time import monotonic
+from typing import List, Tuple, Any, Optional
+
+from pycache._shared._singleton import Singleton
+
+
+class SchedulerEngine(metaclass=Singleton):
+    """
+    One thread which fires all schedule subscriptions. The next deadline of every subscription is kept in a heap,
+    so adding, stopping and starting a subscription is O(log n).
+    Stopped subscriptions are not removed from the heap, their records are skipped once they are popped.
+    The thread keeps the interpreter alive as long as there are subscriptions which are not daemons.
+    The thread only keeps the time, the jobs run in the executor, so that a slow job does not delay the others.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Any, int]] = []
+        self._counter = count()
+        self._active = set()
+        self._keep_alive = set()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        The thread pool the jobs of subscriptions without their own executor run in
+        """
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(thread_name_prefix="pycache-job")
+        return self._executor
+
+    @property
+    def event_loop(self) -> asyncio.AbstractEventLoop:
+        """
+        The event loop the coroutine jobs of subscriptions without their own event loop or executor run in
+        """
+        if self._event_loop is None:
+            with self._executor_lock:
+                if self._event_loop is None:
+                    loop = asyncio.new_event_loop()
+                    # The schedules keep the interpreter alive with the engine thread, the loop thread does not have to
+                    threading.Thread(target=loop.run_forever, name="pycache-event-loop", daemon=True).start()
+                    self._event_loop = loop
+        return self._event_loop
+
+    def add(self, subscription, deadline: float, daemon: bool = False) -> None:
+        """
+        Fire the subscription at the monotonic deadline.
+        The subscription needs a `_generation` attribute and a `_fire()` method. If the generation changed
+        before the deadline is reached, the subscription is not fired.
+        :param daemon: Do not keep the interpreter alive for this subscription
+        """
+        with self._condition:
+            heappush(self._heap, (deadline, next(self._counter), subscription, subscription._generation))
+            self._active.add(subscription)
+            if not daemon:
+                self._keep_alive.add(subscription)
+
+            if self._thread is None or (self._thread.daemon and self._keep_alive):
+                self._start_thread()
+            self._condition.notify_all()
+
+    def remove(self, subscription) -> None:
+        with self._condition:
+            self._active.discard(subscription)
+            self._keep_alive.discard(subscription)
+            self._condition.notify_all()
+
+    def _start_thread(self) -> None:
+        # A replaced thread notices that it is not the current one anymore and ends
+        self._thread = threading.Thread(target=self._run, name="pycache-scheduler", daemon=not self._keep_alive)
+        self._thread.start()
+
+    def _next_due(self):
+        """
+        Wait until the next record is due and pop it.
+        :return: The record, or None if there are no active subscriptions anymore
+        """
+        with self._condition:
+            while True:
+                if self._thread is not threading.current_thread():
+                    return None
+
+                if not self._active:
+                    # Let the thread end, so that it does not keep the interpreter alive
+                    self._heap.clear()
+                    self._thread = None
+                    return None
+
+                if not self._keep_alive and not self._thread.daemon:
+                    # Only daemon subscriptions are left, they are handed over to a daemon thread
+                    self._start_thread()
+                    return None
+
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                timeout = self._heap[0][0] - monotonic()
+                if timeout <= 0:
+                    return heappop(self._heap)
+                self._condition.wait(timeout)
+
+    def _run(self) -> None:
+        while True:
+            record = self._next_due()
+            if record is None:
+                return
+
+            _, _, subscription, generation = record
+            if subscription._generation == generation and subscription in self._active:
+                try:
+                    subscription._fire()
+                except Exception:
+                    # The thread fires all other subscriptions as well, so it must not end
+                    traceback.print_exc()
@@ -1,53 +1,207 @@
 import asyncio
+import functools
 import threading
+import traceback
 from asyncio import AbstractEventLoop
+from concurrent.futures import Executor, Future
 from datetime import datetime
-from typing import Callable, Any, Tuple, Dict
+from time import monotonic
+from typing import Callable, Any, Tuple, Dict, Optional, Union
 
-from pycache._shared._parser import parse_expires_at, get_schedule_type, ScheduleType, parse_expires_every
+from pycache._scheduler._async_engine import AsyncScheduler
+from pycache._scheduler._engine import SchedulerEngine
+from pycache._shared._hooks import Hooks
+from pycache._shared._parser import Schedule, compile_schedule, ScheduleType
+
+
+OVERLAP_POLICIES = ("skip", "queue", "concurrent")
+MODES = ("fixed_rate", "fixed_delay")
+MISFIRE_POLICIES = ("coalesce", "catch_up")
+
+
+def _run_coroutine_function(func: Callable, args, kwargs) -> Any:
+    # Module level function, so that it can be pickled for process pools
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(func(*args, **kwargs))
+    finally:
+        loop.close()
 
 
 class ScheduleSubscription:
-    def __init__(self, schedule_type: ScheduleType, schedule_str: str, func: Callable, event_loop: AbstractEventLoop,
-                 stop_after: int, args, kwargs):
+    def __init__(self, schedule: Schedule, func: Callable, event_loop: AbstractEventLoop, stop_after: int, args,
+                 kwargs, executor: Executor = None, max_instances: int = 1, overlap: str = "skip",
+                 mode: str = "fixed_rate", misfire: str = "coalesce", max_queued: int = 1):
+        if overlap not in OVERLAP_POLICIES:
+            raise Exception(f"Unknown overlap policy {overlap}, use one of {', '.join(OVERLAP_POLICIES)}")
+        if mode not in MODES:
+            raise Exception(f"Unknown mode {mode}, use one of {', '.join(MODES)}")
+        if misfire not in MISFIRE_POLICIES:
+            raise Exception(f"Unknown misfire policy {misfire}, use one of {', '.join(MISFIRE_POLICIES)}")
+        if max_instances < 1:
+            raise Exception("Max instances cannot be smaller than 1")
+        if max_queued < 1:
+            raise Exception("Max queued cannot be smaller than 1")
+
         self._stop_after = stop_after
-        self._schedule_type = schedule_type
-        self._schedule_str = schedule_str
+        self._compiled_schedule = schedule
         self._args = args
         self._kwargs = kwargs
         self._func = func
         self._event_loop = event_loop
 
-        self._thread = threading.Thread(target=self._schedule)
-        self._kill = threading.Event()
-        self._thread.start()
+        # The running and waiting jobs, in the executor or as tasks in the event loop
+        self._executor = executor
+        self._max_instances = max_instances
+        self._overlap = overlap
+        self._max_queued = max_queued
+        self._instances = 0
+        self._queued = 0
+        self._instances_lock = threading.Lock()
+
+        # Fixed rate schedules fire at anchor + slot * interval
+        self._mode = mode
+        self._misfire = misfire
+        self._anchor = 0.0
+        self._slot = 0
 
-    def _get_or_create_event_loop(self):
+        # Every start and stop invalidates the deadlines which are still in the engine
+        self._generation = 0
+        self._running = False
+        self._deadline = 0.0
+        self._hooks = Hooks()
+        if event_loop and asyncio.iscoroutinefunction(func):
+            # Run coroutine jobs with their event loop as tasks in the loop and not in a thread
+            self._engine = AsyncScheduler.for_loop(event_loop)
+        else:
+            self._engine = SchedulerEngine()
+            if executor is None:
+                self._executor = self._engine.executor
+        self._shared_executor = executor is None
+        self.start()
+
+    def _fire(self):
+        """
+        Called by the engine once the deadline is reached
+        """
+        generation = self._generation
+        self._hooks.emit("fire", self, monotonic() - self._deadline)
+        # Fixed delay schedules continue once the job returned
+        state = self._submit(generation if self._mode == "fixed_delay" else None)
+        if state == "skipped":
+            # The fire was skipped, so it does not count for stop_after
+            self._hooks.emit("missed", self, 1)
+            self._reschedule(generation)
+            return
+
+        if self._stop_after is not None:
+            self._stop_after -= 1
+        if state != "submitted" or self._mode != "fixed_delay":
+            self._reschedule(generation)
+
+    def _reschedule(self, generation: int):
+        if not self._continue_running():
+            self.stop()
+        elif self._running and generation == self._generation:
+            self._add_to_engine()
+
+    def _add_to_engine(self):
+        self._deadline = self._next_deadline()
+        self._engine.add(self, self._deadline)
+
+    def _run_inline(self, generation: Optional[int] = None):
+        """
+        Run a coroutine job as task in its event loop
+        """
+        started = monotonic()
+        self._hooks.emit("start", self)
         try:
-            return asyncio.get_event_loop()
-        except RuntimeError as ex:
-            if "There is no current event loop in thread" in str(ex):
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                return asyncio.get_event_loop()
-
-    def _schedule(self):
-        while self._continue_running():
-            is_killed = self._kill.wait(self._run_in())
-            if is_killed:
-                break
+            task = self._engine.run(self._func(*self._args, **self._kwargs))
+        except Exception as ex:
+            traceback.print_exc()
+            self._not_started(started, generation, ex)
+            return
+        # The task only runs after this call returns
+        task.add_done_callback(functools.partial(self._job_done, started, generation))
+
+    def _finished(self, started: float, exception: Optional[BaseException]):
+        if exception is None:
+            self._hooks.emit("finish", self, monotonic() - started)
+        else:
+            self._hooks.emit("error", self, exception, monotonic() - started)
+
+    def _submit(self, generation: Optional[int]) -> str:
+        """
+        Start the job, if the overlap policy allows it
+        :param generation: Reschedule the subscription with this generation once the job returned
+        :return: If the job was submitted, queued or skipped
+        """
+        with self._instances_lock:
+            if self._instances >= self._max_instances and self._overlap != "concurrent":
+                # A job which is slower than its interval must not build up an endless queue
+                if self._overlap == "skip" or self._queued >= self._max_queued:
+                    return "skipped"
+                self._queued += 1
+                return "queued"
+            self._instances += 1
 
+        self._start_job(generation)
+        return "submitted"
+
+    def _start_job(self, generation: Optional[int] = None):
+        if self._executor:
+            self._submit_to_executor(generation)
+        else:
+            self._run_inline(generation)
+
+    def _submit_to_executor(self, generation: Optional[int] = None):
+        # The duration of executor jobs includes the time they wait for a free worker
+        started = monotonic()
+        self._hooks.emit("start", self)
+        try:
             if asyncio.iscoroutinefunction(self._func):
-                if self._event_loop:
-                    asyncio.ensure_future(self._func(*self._args, **self._kwargs), loop=self._event_loop)
+                if self._shared_executor:
+                    # All coroutine jobs share one event loop instead of creating a loop for every call
+                    future = asyncio.run_coroutine_threadsafe(self._func(*self._args, **self._kwargs),
+                                                              self._engine.event_loop)
                 else:
-                    loop = self._get_or_create_event_loop()
-                    loop.run_until_complete(self._func(*self._args, **self._kwargs))
+                    future = self._executor.submit(_run_coroutine_function, self._func, self._args, self._kwargs)
             else:
-                self._func(*self._args, **self._kwargs)
+                future = self._executor.submit(self._func, *self._args, **self._kwargs)
+        except Exception as ex:
+            # For example an executor which was shut down
+            traceback.print_exc()
+            self._not_started(started, generation, ex)
+            return
+        future.add_done_callback(functools.partial(self._job_done, started, generation))
+
+    def _not_started(self, started: float, generation: Optional[int], exception: Exception):
+        # The job did not run, so it does not use an instance
+        self._finished(started, exception)
+        with self._instances_lock:
+            self._instances -= 1
+        if generation is not None:
+            self._reschedule(generation)
 
-            if self._stop_after is not None:
-                self._stop_after -= 1
+    def _job_done(self, started: float, generation: Optional[int], future: Union[Future, asyncio.Future]):
+        exception = None if future.cancelled() else future.exception()
+        if exception is not None and not isinstance(future, asyncio.Future):
+            # The exceptions of tasks are reported by the async scheduler
+            traceback.print_exception(type(exception), exception, exception.__traceback__)
+        self._finished(started, exception)
+
+        with self._instances_lock:
+            queued = self._queued > 0
+            if queued:
+                self._queued -= 1
+            else:
+                self._instances -= 1
+
+        if generation is not None:
+            self._reschedule(generation)
+        if queued:
+            # Start the queued run in the slot of the finished one
+            self._start_job()
 
     def _continue_running(self):
         if self._stop_after is None:
@@ -55,20 +209,46 @@ class ScheduleSubscription:
         else:
             return self._stop_after > 0
 
+    def _next_deadline(self) -> float:
+        now = monotonic()
+        interval = self._compiled_schedule.interval if self._compiled_schedule.schedule_type == ScheduleType.EVERY \
+            else None
+        if self._mode == "fixed_delay" or not interval:
+            return now + self._run_in()
+
+        # Calculate the deadline from the start, so that the run time of the job does not add up
+        self._slot += 1
+        deadline = self._anchor + self._slot * interval
+        if deadline <= now and self._misfire == "coalesce":
+            # Fire once for all missed slots and continue with the next slot in the future afterwards
+            missed_slot = self._slot
+            self._slot = int((now - self._anchor) // interval)
+            deadline = self._anchor + self._slot * interval
+            if self._slot > missed_slot:
+                self._hooks.emit("missed", self, self._slot - missed_slot)
+        return deadline
+
     def _run_in(self) -> float:
-        if self._schedule_type == ScheduleType.EVERY:
-            return parse_expires_every(self._schedule_str)
-        elif self._schedule_type == ScheduleType.AT:
-            return (parse_expires_at(self._schedule_str) - datetime.now()).total_seconds()
+        now = datetime.now()
+        return (self._compiled_schedule.next_deadline(now) - now).total_seconds()
 
     def stop(self):
-        self._kill.set()
-        self._thread.join(2)
-        self._kill.clear()
+        self._running = False
+        self._generation += 1
+        self._engine.remove(self)
+        # Queued runs are dropped, the running ones finish
+        with self._instances_lock:
+            self._queued = 0
 
     def start(self):
-        self._thread = threading.Thread(target=self._schedule)
-        self._thread.start()
+        if self._running or not self._continue_running():
+            return
+
+        self._running = True
+        self._generation += 1
+        self._anchor = monotonic()
+        self._slot = 0
+        self._add_to_engine()
 
 
 def schedule(
@@ -77,10 +257,17 @@ def schedule(
         stop_after: int = None,
         event_loop: AbstractEventLoop = None,
         args: Tuple[Any] = (),
-        kwargs: Dict[str, Any] = None
+        kwargs: Dict[str, Any] = None,
+        executor: Executor = None,
+        max_instances: int = 1,
+        overlap: str = "skip",
+        mode: str = "fixed_rate",
+        misfire: str = "coalesce",
+        max_queued: int = 1
 ):
     def wrapper(func: Callable):
-        add_schedule(func, call_every, call_at, stop_after, event_loop, args, kwargs)
+        add_schedule(func, call_every, call_at, stop_after, event_loop, args, kwargs, executor, max_instances, overlap,
+                     mode, misfire, max_queued)
 
     return wrapper
 
@@ -91,11 +278,42 @@ def add_schedule(func: Callable,
                  stop_after: int = None,
                  event_loop: AbstractEventLoop = None,
                  args: Tuple[Any] = (),
-                 kwargs: Dict[str, Any] = None
+                 kwargs: Dict[str, Any] = None,
+                 executor: Executor = None,
+                 max_instances: int = 1,
+                 overlap: str = "skip",
+                 mode: str = "fixed_rate",
+                 misfire: str = "coalesce",
+                 max_queued: int = 1
                  ) -> ScheduleSubscription:
-    schedule_type, schedule_str = get_schedule_type(call_every, call_at)
+    """
+    Call a function on a schedule
+    :param func: The function or coroutine function which should be called
+    :param call_every: A string which specifies every how many hours/minutes/seconds (hh:mm:ss) the function is called
+    :param call_at: A string which specifies at which time (hh:mm:ss) the function is called, * is a wildcard
+    :param stop_after: Stop the schedule after the function was called this many times
+    :param event_loop: Run coroutine functions as task in this event loop
+    :param args: The positional arguments the function is called with
+    :param kwargs: The keyword arguments the function is called with
+    :param executor: Submit the calls to this thread or process pool instead of the shared pool of the scheduler
+    :param max_instances: How many calls can run at the same time, in the executor or in the event loop
+    :param overlap: What happens if max_instances calls are still running when the function is due again
+                    skip: Do not call the function this time (default)
+                    queue: Call the function as soon as one of the running calls is finished
+                    concurrent: Call the function anyway and ignore max_instances
+    :param max_queued: How many calls can wait with overlap="queue", further calls are skipped.
+                       Stopping the schedule drops the waiting calls.
+    :param mode: How call_every schedules are timed
+                 fixed_rate: The n-th call is due at start + n * interval, no matter how long the calls take (default)
+                 fixed_delay: The interval starts after the last call returned
+    :param misfire: What happens to fixed rate calls which were missed, because the scheduler was busy
+                    coalesce: Call the function once for all missed calls (default)
+                    catch_up: Call the function for every missed call
+    """
+    compiled_schedule = compile_schedule(call_every, call_at)
 
     if kwargs is None:
         kwargs = {}
 
-    return ScheduleSubscription(schedule_type, schedule_str, func, event_loop, stop_after, args, kwargs)
+    return ScheduleSubscription(compiled_schedule, func, event_loop, stop_after, args, kwargs, executor,
+                                max_instances, overlap, mode, misfire, max_queued)
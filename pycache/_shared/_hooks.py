@@ -0,0 +1,58 @@
+import traceback
+from typing import Callable, Dict, List
+
+from pycache._shared._singleton import Singleton
+
+# hit(func, key), miss(func, key, latency), store(func, key, value), evict(func, key), expire(func, key),
+# backend_error(func, exception)
+CACHE_EVENTS = ("hit", "miss", "store", "evict", "expire", "backend_error")
+# fire(subscription, lateness), start(subscription), finish(subscription, duration),
+# error(subscription, exception, duration), missed(subscription, missed_calls)
+SCHEDULE_EVENTS = ("fire", "start", "finish", "error", "missed")
+
+
+class Hooks(metaclass=Singleton):
+    """
+    The callbacks which are called for cache and schedule events.
+    The callback lists are only changed in place, so the cache wrappers can keep a reference to them and only
+    check if the list is empty on their hot path.
+    """
+
+    def __init__(self):
+        self.callbacks: Dict[str, List[Callable]] = {event: [] for event in CACHE_EVENTS + SCHEDULE_EVENTS}
+
+    def add(self, event: str, callback: Callable) -> None:
+        if event not in self.callbacks:
+            raise Exception(f"Unknown event {event}, use one of {', '.join(self.callbacks)}")
+        self.callbacks[event].append(callback)
+
+    def remove(self, event: str, callback: Callable) -> None:
+        if event not in self.callbacks:
+            raise Exception(f"Unknown event {event}, use one of {', '.join(self.callbacks)}")
+        self.callbacks[event].remove(callback)
+
+    def emit(self, event: str, *args) -> None:
+        for callback in list(self.callbacks[event]):
+            try:
+                callback(*args)
+            except Exception:
+                # A broken metrics exporter must not break the cached function or the schedule
+                traceback.print_exc()
+
+
+def add_hook(event: str, callback: Callable) -> Callable:
+    """
+    Call a function every time an event happens.
+    Cache events: hit(func, key), miss(func, key, latency), store(func, key, value), evict(func, key),
+                  expire(func, key), backend_error(func, exception)
+    Schedule events: fire(subscription, lateness), start(subscription), finish(subscription, duration),
+                     error(subscription, exception, duration), missed(subscription, missed_calls)
+    Times are given in seconds.
+    :return: The callback
+    """
+    Hooks().add(event, callback)
+    return callback
+
+
+def remove_hook(event: str, callback: Callable) -> None:
+    Hooks().remove(event, callback)
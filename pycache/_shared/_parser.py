@@ -1,7 +1,11 @@
 import re
 from calendar import monthrange
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import IntEnum
+from time import monotonic
+from typing import Optional, Tuple
+
+_WILDCARD = re.compile("^\\*+$")
 
 
 def _test_valid_string(seconds, minutes, hours):
@@ -16,93 +20,128 @@ def _test_valid_string(seconds, minutes, hours):
         raise Exception("An hour has to be between 0, ... 23")
 
 
-def parse_expires_at(schedule_str: str, current: datetime = None) -> datetime:
-    if not current:
-        current = datetime.now()
-
+def _split_schedule_str(schedule_str: str) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """
+    Split a hh:mm:ss string into hours, minutes and seconds. Wildcards are returned as None.
+    """
     split_str = schedule_str.split(":")
-    h = split_str[0]
-    m = split_str[1]
-    s = split_str[2]
-
-    years = current.year
-    months = current.month
-    days = current.day
-
-    # Check for wildcards and otherwise use the value in the string
-    if not re.search("^\\*+$", s):
-        seconds = int(s)
-    else:
-        seconds = current.second
-
-    if not re.search("^\\*+$", m):
-        minutes = int(m)
-    else:
-        minutes = current.minute
-
-    if not re.search("^\\*+$", h):
-        hours = int(h)
-    else:
-        hours = current.hour
-
-    # Check if the template syntax has the right ranges
-    _test_valid_string(seconds, minutes, hours)
-
-    return_time = datetime(years, months, days, hours, minutes, seconds)
-    if current >= return_time:
-        # If Minutes is the smallest wildcard
-        if re.search("^\\*+$", h) and re.search("^\\*+$", m):
-            minutes += 1
-        # If Hours is the smallest wildcard
-        elif re.search("^\\*+$", h):
-            hours += 1
-        # If There is no wildcard
-        else:
-            days += 1
+    return tuple(None if _WILDCARD.search(part) else int(part) for part in split_str[:3])
 
-        # Verify that the data is valid and if not handle the overflow
-        if minutes == 60:
-            hours += 1
-            minutes = 0
 
-        if hours == 24:
-            days += 1
-            hours = 0
+class ScheduleType(IntEnum):
+    EVERY = 0
+    AT = 1
 
-        if days == monthrange(current.year, current.month)[1] + 1:
-            months += 1
-            days = 1
 
-        if months > 12:
-            years += 1
-            months = 1
+class Schedule:
+    """
+    A schedule string which was parsed once, so that calculating the next deadline does no string work
+    """
 
-        return_time = datetime(years, months, days, hours, minutes, seconds)
-    return return_time
+    def __init__(self, schedule_type: ScheduleType, schedule_str: str):
+        self.schedule_type = schedule_type
+        self.schedule_str = schedule_str
+        self._hours, self._minutes, self._seconds = _split_schedule_str(schedule_str)
 
+        if schedule_type == ScheduleType.EVERY:
+            self.interval = (self._hours or 0) * 60 * 60 + (self._minutes or 0) * 60 + (self._seconds or 0)
+            self._interval_delta = timedelta(seconds=self.interval)
+        else:
+            # Check if the template syntax has the right ranges
+            _test_valid_string(self._seconds or 0, self._minutes or 0, self._hours or 0)
+
+        # If the wildcards only lead the string (*:*:ss, *:mm:ss, hh:mm:ss) every call before the next deadline
+        # returns this deadline again, so it can be reused without looking at the wall clock.
+        self._reuse_deadline = schedule_type == ScheduleType.AT and self._seconds is not None and \
+                               (self._minutes is not None or self._hours is None)
+        self._last_deadline = float("-inf")
+
+    def next_deadline(self, now: datetime) -> datetime:
+        if self.schedule_type == ScheduleType.EVERY:
+            return now + self._interval_delta
+        return self._next_at(now)
+
+    def next_monotonic_deadline(self) -> float:
+        """
+        The next deadline as a value comparable with time.monotonic()
+        """
+        now = monotonic()
+        if self.schedule_type == ScheduleType.EVERY:
+            return now + self.interval
+
+        if self._reuse_deadline and now < self._last_deadline:
+            return self._last_deadline
 
-def parse_expires_every(expiry_str: str) -> int:
-    split_str = expiry_str.split(":")
-    h = split_str[0]
-    m = split_str[1]
-    s = split_str[2]
+        current = datetime.now()
+        deadline = now + (self._next_at(current) - current).total_seconds()
+        self._last_deadline = deadline
+        return deadline
+
+    def deadline_after(self, deadline: float) -> float:
+        """
+        The first monotonic deadline after the given one, for values which are computed before their deadline
+        """
+        if self.schedule_type == ScheduleType.EVERY:
+            return monotonic() + self.interval
+
+        now = monotonic()
+        current = datetime.now()
+        # The deadlines are whole seconds, so half a second later is safely past the given one
+        after = current + timedelta(seconds=deadline - now + 0.5)
+        return max(now + (self._next_at(after) - current).total_seconds(), self.next_monotonic_deadline())
 
-    seconds = 0
-    if not re.search("^\\*+$", h):
-        seconds += int(h) * 60 * 60
+    def _next_at(self, current: datetime) -> datetime:
+        years = current.year
+        months = current.month
+        days = current.day
 
-    if not re.search("^\\*+$", m):
-        seconds += int(m) * 60
+        # Use the value of the schedule and otherwise the current one for wildcards
+        seconds = current.second if self._seconds is None else self._seconds
+        minutes = current.minute if self._minutes is None else self._minutes
+        hours = current.hour if self._hours is None else self._hours
 
-    if not re.search("^\\*+$", s):
-        seconds += int(s)
+        return_time = datetime(years, months, days, hours, minutes, seconds)
+        if current >= return_time:
+            # If Minutes is the smallest wildcard
+            if self._hours is None and self._minutes is None:
+                minutes += 1
+            # If Hours is the smallest wildcard
+            elif self._hours is None:
+                hours += 1
+            # If There is no wildcard
+            else:
+                days += 1
+
+            # Verify that the data is valid and if not handle the overflow
+            if minutes == 60:
+                hours += 1
+                minutes = 0
+
+            if hours == 24:
+                days += 1
+                hours = 0
+
+            if days == monthrange(current.year, current.month)[1] + 1:
+                months += 1
+                days = 1
+
+            if months > 12:
+                years += 1
+                months = 1
+
+            return_time = datetime(years, months, days, hours, minutes, seconds)
+        return return_time
 
-    return seconds
 
+def parse_expires_at(schedule_str: str, current: datetime = None) -> datetime:
+    if not current:
+        current = datetime.now()
 
-class ScheduleType(IntEnum):
-    EVERY = 0
-    AT = 1
+    return Schedule(ScheduleType.AT, schedule_str).next_deadline(current)
+
+
+def parse_expires_every(expiry_str: str) -> int:
+    return Schedule(ScheduleType.EVERY, expiry_str).interval
 
 
 def get_schedule_type(expires_every: str = None, expires_at: str = None) -> (ScheduleType, str):
@@ -115,3 +154,7 @@ def get_schedule_type(expires_every: str = None, expires_at: str = None) -> (Sch
         return ScheduleType.AT, expires_at
 
     raise Exception("")
+
+
+def compile_schedule(expires_every: str = None, expires_at: str = None) -> Schedule:
+    return Schedule(*get_schedule_type(expires_every, expires_at))
@@ -0,0 +1,403 @@
+import asyncio
+import multiprocessing
+import os
+import socketserver
+import subprocess
+import sys
+import threading
+from time import sleep, monotonic
+
+import pytest
+
+from pycache import cache, add_hook, remove_hook, SQLiteBackend, SharedMemoryBackend, RedisBackend, AsyncRedisBackend, RedisError
+from pycache._backends._backend import backend_key
+from pycache._cache._memmory_db import DataCache
+
+
+def test_sqlite_backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+    backend.set("key", {"value": [1, 2]}, 10)
+
+    value, ttl = backend.get("key")
+    assert value == {"value": [1, 2]}
+    assert 9 < ttl <= 10
+
+    backend.set("expired", 1, 0.1)
+    sleep(0.2)
+    assert backend.get("expired") is None
+    assert backend.purge_expired() == 1
+
+    backend.delete("key")
+    assert backend.get("key") is None
+    assert backend.get("missing") is None
+
+    # The values survive a new connection to the file
+    backend.set("key", "value", 10)
+    backend.close()
+    assert SQLiteBackend(str(tmp_path / "cache.db")).get("key")[0] == "value"
+
+
+def test_backend_key():
+    key = DataCache.hash_args((1, "a"), {"b": 2})
+    assert backend_key("module.func", key) == backend_key("module.func", DataCache.hash_args((1, "a"), {"b": 2}))
+    assert backend_key("module.func", key) != backend_key("module.other", key)
+
+    # Arguments which are compared by identity can not be persisted
+    assert backend_key("module.func", DataCache.hash_args(([1],), {})) is None
+
+    # Equal arguments give the same key, no matter if they are the same object
+    shared = "a" * 10
+    assert backend_key("module.func", DataCache.hash_args((shared, shared), {})) == \
+        backend_key("module.func", DataCache.hash_args((shared, "".join(["a"] * 10)), {}))
+
+    # Sets are pickled in hash order, which is different in every process
+    script = "from pycache._backends._backend import backend_key; from pycache._cache._memmory_db import DataCache; " \
+             "print(backend_key('module.func', DataCache.hash_args(({'a': {'x', 'y'}}, frozenset('pq')), {}, " \
+             "hash_by_content=True)))"
+    keys = {
+        subprocess.run([sys.executable, "-c", script], env={**os.environ, "PYTHONHASHSEED": str(seed)},
+                       stdout=subprocess.PIPE, check=True).stdout
+        for seed in range(3)
+    }
+    assert len(keys) == 1
+
+
+def test_backend_namespace(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+
+    # Every function created here would share its backend entries
+    with pytest.raises(Exception):
+        @cache("*:*:10", backend=backend)
+        def compute(value):
+            return value
+
+    @cache("*:*:10", backend=backend, namespace="tests.namespace")
+    def compute(value):
+        return value * 2
+
+    assert compute(2) == 4
+    assert backend.get(backend_key("tests.namespace", DataCache.hash_args((2,), {})))[0] == 4
+
+
+def _make_function(backend, counter, write_policy="write_through"):
+    # Every call creates a new function with the same name, like a restarted process
+    @cache("*:*:10", backend=backend, namespace="tests.compute", write_policy=write_policy)
+    def compute(value):
+        counter["value"] += 1
+        return value * 2
+
+    return compute
+
+
+def test_warm_restart(tmp_path):
+    counter = {"value": 0}
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+
+    compute = _make_function(backend, counter)
+    assert compute(2) == 4
+    assert compute(2) == 4
+    assert counter["value"] == 1
+
+    restarted = _make_function(SQLiteBackend(str(tmp_path / "cache.db")), counter)
+    assert restarted(2) == 4
+    assert restarted(3) == 6
+    assert counter["value"] == 2
+
+
+def test_write_behind(tmp_path):
+    counter = {"value": 0}
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+
+    compute = _make_function(backend, counter, "write_behind")
+    assert compute(2) == 4
+    compute.flush()
+    assert backend.get(backend_key("tests.compute", DataCache.hash_args((2,), {})))[0] == 4
+
+    with pytest.raises(Exception):
+        _make_function(backend, counter, "write_around")
+
+
+def test_backend_async(tmp_path):
+    counter = {"value": 0}
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+
+    def make():
+        @cache("*:*:10", backend=backend, namespace="tests.compute")
+        async def compute(value):
+            counter["value"] += 1
+            return value * 2
+
+        return compute
+
+    loop = asyncio.get_event_loop()
+    assert loop.run_until_complete(make()(2)) == 4
+    assert loop.run_until_complete(make()(2)) == 4
+    assert counter["value"] == 1
+
+
+def test_backend_get_many(tmp_path):
+    batches = []
+    backend = SQLiteBackend(str(tmp_path / "cache.db"))
+
+    def load_all(arguments):
+        batches.append(arguments)
+        return [value * 2 for value, in arguments]
+
+    def make():
+        @cache("*:*:10", backend=backend, namespace="tests.compute", batch=load_all)
+        def compute(value):
+            return value * 2
+
+        return compute
+
+    assert make().get_many([(1,), (2,)]) == [2, 4]
+    # A restarted process finds the values in the backend and only loads the new ones
+    assert make().get_many([(1,), (2,), (3,)]) == [2, 4, 6]
+    assert batches == [[(1,), (2,)], [(3,)]]
+
+
+def test_shared_memory_backend(tmp_path):
+    backend = SharedMemoryBackend(str(tmp_path / "cache"), slots=16, slot_size=256)
+    backend.set("key", {"value": [1, 2]}, 10)
+
+    value, ttl = backend.get("key")
+    assert value == {"value": [1, 2]}
+    assert 9 < ttl <= 10
+
+    # Too large for a slot
+    backend.set("large", "x" * 1000, 10)
+    assert backend.get("large") is None
+
+    backend.set("expired", 1, 0.1)
+    sleep(0.2)
+    assert backend.get("expired") is None
+    assert backend.purge_expired() == 1
+
+    backend.delete("key")
+    assert backend.get("key") is None
+
+    with pytest.raises(Exception, match="is not a cache file with 32 slots"):
+        SharedMemoryBackend(str(tmp_path / "cache"), slots=32, slot_size=256)
+
+
+def test_shared_memory_eviction(tmp_path):
+    backend = SharedMemoryBackend(str(tmp_path / "cache"), slots=2, slot_size=256)
+    backend.set("a", 1, 10)
+    backend.set("b", 2, 10)
+    backend.get("a")
+    sleep(0.01)
+    backend.get("b")
+    sleep(0.01)
+    backend.get("a")
+
+    # b is the least recently used entry
+    backend.set("c", 3, 10)
+    assert backend.get("a")[0] == 1
+    assert backend.get("b") is None
+    assert backend.get("c")[0] == 3
+
+
+def test_shared_between_processes(tmp_path):
+    counter = {"value": 0}
+    compute = _make_function(SharedMemoryBackend(str(tmp_path / "cache")), counter)
+
+    # The forked worker computes the value and the parent reads it from the shared table
+    process = multiprocessing.get_context("fork").Process(target=compute, args=(21,))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+    assert compute(21) == 42
+    assert counter["value"] == 0
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.server.connections += 1
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            arguments = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                arguments.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(self.server.execute(arguments))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """
+    Understands the few commands the redis backends use
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.data = {}
+        self.connections = 0
+        self.commands = 0
+
+    def _get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= monotonic():
+            del self.data[key]
+            return None, None
+        return value, expires_at
+
+    def execute(self, arguments) -> bytes:
+        self.commands += 1
+        command = arguments[0].upper()
+        if command == b"GET":
+            value, _ = self._get(arguments[1])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if command == b"PTTL":
+            value, expires_at = self._get(arguments[1])
+            if value is None:
+                return b":-2\r\n"
+            return b":-1\r\n" if expires_at is None else b":%d\r\n" % int((expires_at - monotonic()) * 1000)
+        if command == b"SET":
+            expires_at = monotonic() + int(arguments[4]) / 1000 if len(arguments) > 4 else None
+            self.data[arguments[1]] = (arguments[2], expires_at)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            return b":%d\r\n" % (self.data.pop(arguments[1], None) is not None)
+        if command == b"AUTH":
+            return b"+OK\r\n" if arguments[1] == b"secret" else b"-WRONGPASS invalid password\r\n"
+        if command == b"SELECT":
+            return b"+OK\r\n"
+        return b"-ERR unknown command\r\n"
+
+
+@pytest.fixture
+def redis_server():
+    server = FakeRedisServer()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_redis_backend(redis_server):
+    backend = RedisBackend(*redis_server.server_address, password="secret")
+    backend.set("key", {"value": [1, 2]}, 10)
+
+    value, ttl = backend.get("key")
+    assert value == {"value": [1, 2]}
+    assert 9 < ttl <= 10
+
+    backend.set("expired", 1, 0.05)
+    sleep(0.1)
+    assert backend.get("expired") is None
+
+    backend.delete("key")
+    assert backend.get("key") is None
+
+    # All calls of one thread use the same pooled connection
+    assert redis_server.connections == 1
+
+    with pytest.raises(RedisError):
+        RedisBackend(*redis_server.server_address, password="wrong").get("key")
+
+
+def test_redis_pipeline(redis_server):
+    backend = RedisBackend(*redis_server.server_address)
+    backend.set_many({f"key{i}": i for i in range(10)}, 10)
+
+    entries = backend.get_many([f"key{i}" for i in range(10)] + ["missing"])
+    assert [value for value, _ in entries[:10]] == list(range(10))
+    assert entries[10] is None
+    assert redis_server.connections == 1
+
+
+def test_redis_pool_limit(redis_server):
+    backend = RedisBackend(*redis_server.server_address, max_connections=2)
+
+    def work():
+        for i in range(20):
+            backend.set(f"key{i}", i, 10)
+            backend.get(f"key{i}")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert redis_server.connections <= 2
+
+
+def test_redis_cache(redis_server):
+    counter = {"value": 0}
+    backend = RedisBackend(*redis_server.server_address)
+
+    assert _make_function(backend, counter)(2) == 4
+    # Another host with an empty memory cache
+    assert _make_function(backend, counter)(2) == 4
+    assert counter["value"] == 1
+
+
+def test_unreachable_backend(tmp_path):
+    # A port which nobody listens on
+    with socketserver.TCPServer(("127.0.0.1", 0), socketserver.BaseRequestHandler) as server:
+        address = server.server_address
+    errors = []
+
+    def on_error(func, exception):
+        errors.append(exception)
+
+    add_hook("backend_error", on_error)
+    try:
+        for write_policy in ("write_through", "write_behind"):
+            counter = {"value": 0}
+            compute = _make_function(RedisBackend(*address), counter, write_policy)
+            assert compute(2) == 4
+            assert compute(2) == 4
+            if write_policy == "write_behind":
+                compute.flush()
+            assert counter["value"] == 1
+
+        # Values which can not be pickled are only cached in memory
+        @cache("*:*:10", backend=SQLiteBackend(str(tmp_path / "cache.db")), namespace="tests.lock")
+        def lock():
+            return threading.Lock()
+
+        assert lock() is lock()
+    finally:
+        remove_hook("backend_error", on_error)
+
+    assert len(errors) == 5
+    assert all(isinstance(error, ConnectionRefusedError) for error in errors[:4])
+
+
+def test_async_redis_backend(redis_server):
+    counter = {"value": 0}
+    backend = AsyncRedisBackend(*redis_server.server_address)
+
+    def make():
+        @cache("*:*:10", backend=backend, namespace="tests.async_compute")
+        async def compute(value):
+            counter["value"] += 1
+            return value * 2
+
+        return compute
+
+    async def run():
+        assert await make()(2) == 4
+        assert await make()(2) == 4
+
+        await backend.set_many({"a": 1, "b": 2}, 10)
+        assert [value for value, _ in await backend.get_many(["a", "b"])] == [1, 2]
+        await backend.delete("a")
+        assert await backend.get("a") is None
+        backend.close()
+
+    asyncio.get_event_loop().run_until_complete(run())
+    assert counter["value"] == 1
+    assert redis_server.connections == 1
+
+    with pytest.raises(Exception):
+        @cache("*:*:10", backend=backend, namespace="tests.sync_function")
+        def sync_function():
+            pass
@@ -1,13 +1,19 @@
 import asyncio
+import gc
+import threading
 from datetime import datetime, timedelta
 
 import pytest
 import toml
-from time import sleep
+from time import sleep, monotonic
 
-from pycache import __version__, cache
-from pycache._cache._memmory_db import DataCache, FunctionCache
+from pycache import __version__, cache, purge_expired, start_expiry_sweeper, set_global_max_bytes, cache_stats, \
+    add_hook, remove_hook, cached_method
+from pycache._cache._memmory_db import DataCache, FunctionCache, SegmentedFunctionCache, _KWARGS_MARK
+from pycache._cache._sizeof import deep_sizeof
+from pycache._cache._stats import CacheStats
 from pycache._cache._memmory_db import DataCache as CDataCache
+from pycache._shared._parser import compile_schedule
 from pycache._shared._singleton import Singleton
 
 
@@ -28,6 +34,8 @@ def test_singleton():
     assert c3 is c4
     assert c2 is not c3 and c1 is not c3
 
+    del c1.cache["hello"]
+
 
 def test_version():
     try:
@@ -82,18 +90,9 @@ def test_expiry_date():
         wrapped_cache_method()
 
         key = DataCache.hash_args(tuple(), dict())
-        expiry_date = data_cache.cache[cache_method].cache[key]._timer._expiry_date
-        calc_exp_date = datetime.now() + timedelta(0, seconds)
-
-        assert expiry_date.year == calc_exp_date.year
-        assert expiry_date.month == calc_exp_date.month
-        assert expiry_date.day == calc_exp_date.day
-        assert expiry_date.hour == calc_exp_date.hour
-        assert expiry_date.minute == calc_exp_date.minute
-        try:
-            assert expiry_date.second == calc_exp_date.second
-        except AssertionError:
-            assert expiry_date.second == calc_exp_date.second - 1
+        deadline = data_cache.cache[cache_method].cache[key].deadline
+
+        assert monotonic() + seconds - 1 <= deadline <= monotonic() + seconds
 
     internal("1:0:0", 60 * 60)
     internal("*:45:0", 45 * 60)
@@ -101,6 +100,17 @@ def test_expiry_date():
     internal("*:*:*", 0)
 
 
+def test_compact_entries():
+    @cache("*:*:10")
+    def cache_method(value):
+        return value
+
+    cache_method(1)
+    entry = DataCache().cache[cache_method.__wrapped__].cache[DataCache.hash_args((1,), {})]
+    assert not hasattr(entry, "__dict__")
+    assert entry.value == 1
+
+
 def test_invalid_cache_size():
     with pytest.raises(Exception):
         @cache(expires_every="*:*:1", max_cache_size=-1)
@@ -203,3 +213,864 @@ def test_schedule_and_expire():
     now = datetime.now()
     internal(f"*:1:{now.second}", 1, 0)
     internal(f"*:1:*", 1, 0)
+
+
+def test_eviction_policy():
+    @cache("*:*:10", max_cache_size=2, eviction="lru")
+    def method(value, c):
+        c[value] += 1
+
+    counter = {1: 0, 2: 0, 3: 0}
+
+    method(1, counter)
+    method(2, counter)
+    method(1, counter)
+    method(3, counter)
+    method(1, counter)
+
+    assert counter[1] == 1
+    assert counter[3] == 1
+
+    with pytest.raises(Exception):
+        @cache("*:*:10", eviction="random")
+        def invalid():
+            pass
+
+
+def test_coalesce_sync():
+    counter = {"value": 0}
+    barrier = threading.Barrier(5)
+
+    @cache("*:*:10", coalesce=True)
+    def slow(value):
+        counter["value"] += 1
+        sleep(0.2)
+        return value * 2
+
+    results = []
+
+    def call():
+        barrier.wait()
+        results.append(slow(21))
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter["value"] == 1
+    assert results == [42] * 5
+
+
+def test_coalesce_async():
+    counter = {"value": 0}
+
+    @cache("*:*:10", coalesce=True)
+    async def slow(value):
+        counter["value"] += 1
+        await asyncio.sleep(0.1)
+        return value * 2
+
+    @cache("*:*:10", coalesce=True)
+    async def failing():
+        counter["value"] += 1
+        await asyncio.sleep(0.1)
+        raise ValueError("failed")
+
+    async def run():
+        results = await asyncio.gather(*(slow(21) for _ in range(5)))
+        errors = await asyncio.gather(*(failing() for _ in range(3)), return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.get_event_loop().run_until_complete(run())
+
+    assert results == [42] * 5
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert counter["value"] == 2
+
+
+def test_coalesce_leader_cancelled():
+    counter = {"value": 0}
+
+    @cache("*:*:10", coalesce=True)
+    async def slow(value):
+        counter["value"] += 1
+        await asyncio.sleep(0.1)
+        return value * 2
+
+    async def run():
+        leader = asyncio.ensure_future(slow(21))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(slow(21))
+        await asyncio.sleep(0.01)
+
+        # The follower still gets the value, if the caller which started the computation is cancelled
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await follower == 42
+
+    asyncio.get_event_loop().run_until_complete(run())
+    assert counter["value"] == 1
+
+
+def test_segmented_function_cache():
+    function_cache = SegmentedFunctionCache(10, compile_schedule("*:*:10"), "lru", segments=4)
+
+    assert len(function_cache.segments) == 4
+    assert sum(segment.max_cache_entries for segment in function_cache.segments) == 10
+    assert len(SegmentedFunctionCache(2, segments=16).segments) == 2
+
+    for key in range(100):
+        function_cache.add_cache_entry(key, key)
+    assert len(function_cache.cache) == 10
+    for key in function_cache.cache:
+        assert function_cache.get_value_from_cache(key) == key
+
+    function_cache.remove_cache_entry(99)
+    assert not function_cache.is_in_cache(99)
+    with pytest.raises(Exception):
+        function_cache.get_value_from_cache(99)
+
+
+def test_thread_safe_cache():
+    errors = []
+
+    @cache("*:*:10", max_cache_size=8, eviction="lru", thread_safe=True, segments=4)
+    def method(value):
+        return value * 2
+
+    def call(offset):
+        try:
+            for i in range(2000):
+                assert method((i + offset) % 20) == ((i + offset) % 20) * 2
+        except Exception as ex:
+            errors.append(ex)
+
+    threads = [threading.Thread(target=call, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+
+
+def test_stale_while_revalidate():
+    counter = {"value": 0}
+
+    @cache(expires_every="*:*:1", stale_while_revalidate="*:*:5")
+    def method():
+        counter["value"] += 1
+        sleep(0.2)
+        return counter["value"]
+
+    assert method() == 1
+    sleep(1.1)
+
+    # The expired value is returned immediately and refreshed in the background
+    start = monotonic()
+    assert method() == 1
+    assert method() == 1
+    assert monotonic() - start < 0.1
+
+    sleep(0.5)
+    assert method() == 2
+    assert counter["value"] == 2
+
+
+def test_stale_while_revalidate_async():
+    counter = {"value": 0}
+
+    @cache(expires_every="*:*:1", stale_while_revalidate="*:*:5")
+    async def method():
+        counter["value"] += 1
+        await asyncio.sleep(0.1)
+        return counter["value"]
+
+    async def run():
+        assert await method() == 1
+        await asyncio.sleep(1.1)
+        assert await method() == 1
+        assert await method() == 1
+        await asyncio.sleep(0.3)
+        assert await method() == 2
+
+    asyncio.get_event_loop().run_until_complete(run())
+    assert counter["value"] == 2
+
+
+def test_stale_window_ends():
+    counter = {"value": 0}
+
+    @cache(expires_every="*:*:1", stale_while_revalidate="*:*:1")
+    def method():
+        counter["value"] += 1
+        return counter["value"]
+
+    method()
+    sleep(2.1)
+    assert method() == 2
+
+
+def test_failed_refresh_is_reported(capsys):
+    counter = {"value": 0}
+
+    @cache(expires_every="*:*:1", stale_while_revalidate="*:*:5")
+    def method():
+        counter["value"] += 1
+        if counter["value"] > 1:
+            raise ValueError("sync refresh failed")
+        return counter["value"]
+
+    @cache(expires_every="*:*:1", stale_while_revalidate="*:*:5")
+    async def async_method():
+        counter["value"] += 1
+        if counter["value"] > 3:
+            raise ValueError("async refresh failed")
+        return counter["value"]
+
+    async def run():
+        await async_method()
+        await asyncio.sleep(1.1)
+        # The old value is returned and the failed refresh is printed
+        assert await async_method() == 3
+        await asyncio.sleep(0.1)
+
+    assert method() == 1
+    sleep(1.1)
+    assert method() == 1
+    sleep(0.1)
+    asyncio.get_event_loop().run_until_complete(run())
+
+    err = capsys.readouterr().err
+    assert "ValueError: sync refresh failed" in err
+    assert "ValueError: async refresh failed" in err
+
+
+def test_purge_expired():
+    @cache(expires_every="*:*:1", max_cache_size=100)
+    def method(value):
+        return value
+
+    for i in range(10):
+        method(i)
+    assert method.purge_expired() == 0
+
+    sleep(1.1)
+    method(10)
+    assert method.purge_expired() == 10
+    assert list(DataCache().cache[method.__wrapped__].cache) == [DataCache.hash_args((10,), {})]
+
+
+def test_purge_skips_overwritten_and_stale():
+    function_cache = FunctionCache(100, compile_schedule("*:*:1"), stale_window=1)
+    for _ in range(100):
+        function_cache.add_cache_entry(1, 1)
+    assert len(function_cache._expiry_heap) < 100
+
+    sleep(1.1)
+    # Still in the stale window
+    assert function_cache.purge_expired() == 0
+    sleep(1)
+    assert function_cache.purge_expired() == 1
+    assert not function_cache.cache
+
+
+def test_expiry_sweeper():
+    @cache(expires_every="*:*:1", thread_safe=True)
+    def method(value):
+        return value
+
+    for i in range(10):
+        method(i)
+
+    sweeper = start_expiry_sweeper("*:*:1")
+    sleep(2.5)
+    sweeper.stop()
+
+    assert len(DataCache().cache[method.__wrapped__].cache) == 0
+    assert purge_expired() >= 0
+
+
+def test_sweeper_with_concurrent_inserts():
+    @cache(expires_every="*:*:1", max_cache_size=5000, eviction="lru")
+    def method(value):
+        return value
+
+    errors = []
+    running = True
+
+    def purge():
+        while running:
+            try:
+                method.purge_expired()
+            except Exception as ex:
+                errors.append(ex)
+
+    # The sweeper runs in another thread than the calls, which insert, evict and hit at the same time
+    sweeper = threading.Thread(target=purge)
+    sweeper.start()
+    try:
+        end = monotonic() + 2.5
+        i = 0
+        while monotonic() < end:
+            value = i % 4000 if i % 3 else 4000 + i % 3000
+            assert method(value) == value
+            i += 1
+    finally:
+        running = False
+        sweeper.join()
+    assert errors == []
+    assert method.cache_stats().expirations > 0
+
+
+def test_deep_sizeof():
+    shared = "x" * 1000
+    assert deep_sizeof([shared]) > 1000
+    assert deep_sizeof([shared, shared]) < deep_sizeof([shared, "y" * 1000])
+    assert deep_sizeof({"key": [shared]}) > deep_sizeof({"key": []})
+
+    class Slotted:
+        __slots__ = ("value",)
+
+        def __init__(self, value):
+            self.value = value
+
+    assert deep_sizeof(Slotted(shared)) > 1000
+
+
+def test_max_bytes():
+    function_cache = FunctionCache(100, compile_schedule("*:*:10"), max_bytes=10, sizeof=len)
+    function_cache.add_cache_entry(1, "aaaa")
+    function_cache.add_cache_entry(2, "bbbb")
+    function_cache.add_cache_entry(3, "cc")
+    assert function_cache.current_bytes == 10
+
+    function_cache.add_cache_entry(4, "dddd")
+    assert sorted(function_cache.cache) == [2, 3, 4]
+
+    # Growing an entry evicts the other ones
+    function_cache.add_cache_entry(3, "cccccc")
+    assert sorted(function_cache.cache) == [3, 4]
+    assert function_cache.current_bytes == 10
+
+    # Values which are larger than the budget are not cached
+    function_cache.add_cache_entry(5, "e" * 11)
+    assert not function_cache.is_in_cache(5)
+
+
+def test_max_bytes_evicts_large_entries_first():
+    function_cache = FunctionCache(100, compile_schedule("*:*:10"), "lru", max_bytes=100, sizeof=len)
+    for key, value in (("a", "a" * 10), ("b", "b" * 10), ("large", "x" * 50), ("c", "c" * 10), ("d", "d" * 10)):
+        function_cache.add_cache_entry(key, value)
+
+    # "a" would be evicted first, but the large entry is one of the next victims and frees more
+    function_cache.add_cache_entry("e", "e" * 20)
+    assert sorted(function_cache.cache) == ["a", "b", "c", "d", "e"]
+    assert function_cache.current_bytes == 60
+
+
+def test_max_bytes_decorator():
+    counter = {"value": 0}
+
+    @cache("*:*:10", max_bytes=2000, sizeof=len)
+    def method(size):
+        counter["value"] += 1
+        return "x" * size
+
+    method(1000)
+    method(900)
+    method(1000)
+    assert counter["value"] == 2
+
+    method(500)
+    method(1000)
+    assert counter["value"] == 4
+
+
+def test_max_bytes_thread_safe():
+    @cache("*:*:10", thread_safe=True, max_bytes=16000, sizeof=len)
+    def method(key):
+        return "x" * 5000
+
+    # The budget is shared by all segments, so values larger than a sixteenth of it are cached as well
+    method(1)
+    method(1)
+    assert method.cache_info().currsize == 1
+
+    for key in range(2, 6):
+        method(key)
+    assert method.cache_info().currsize == 3
+    assert method.cache_stats().bytes == 15000
+
+
+def test_global_max_bytes():
+    @cache("*:*:10", sizeof=len)
+    def method1(size):
+        return "x" * size
+
+    @cache("*:*:10")
+    def method2(size):
+        return "x" * size
+
+    try:
+        method1(5000)
+        method2(5000)
+        set_global_max_bytes(DataCache().current_bytes)
+        method1(6000)
+
+        assert DataCache().current_bytes <= DataCache().max_bytes
+        assert len(DataCache().cache[method1.__wrapped__].cache) + \
+               len(DataCache().cache[method2.__wrapped__].cache) < 3
+    finally:
+        set_global_max_bytes(None)
+
+
+def test_global_byte_counter():
+    class Service:
+        @cached_method("*:*:10", sizeof=len)
+        def load(self, size):
+            return "x" * size
+
+    # The total is updated by the caches, so it does not have to be summed up
+    start = DataCache().current_bytes
+    services = [Service() for _ in range(3)]
+    for size in (100, 200, 300):
+        services[size // 100 - 1].load(size)
+    assert DataCache().current_bytes == start + 600
+    assert DataCache().current_bytes == sum(cache.current_bytes for cache in DataCache().cache.values())
+
+    # A removed cache takes its bytes with it
+    services.pop(0)
+    gc.collect()
+    assert DataCache().current_bytes == start + 500
+
+
+def test_hash_args():
+    assert DataCache.hash_args((1, 2), {}) == DataCache.hash_args((1, 2), {})
+    assert DataCache.hash_args((), {"a": 1, "b": 2}) == DataCache.hash_args((), {"b": 2, "a": 1})
+    assert DataCache.hash_args((1, "a", 2), {}) != DataCache.hash_args((1,), {"a": 2})
+    assert DataCache.hash_args((3,), {}) == DataCache.hash_args((3.0,), {})
+    assert DataCache.hash_args((3,), {}, typed=True) != DataCache.hash_args((3.0,), {}, typed=True)
+    assert DataCache.hash_args((), {"a": 3}, typed=True) != DataCache.hash_args((), {"a": 3.0}, typed=True)
+
+    unhashable = [1, 2]
+    assert DataCache.hash_args((unhashable, 1), {"c": unhashable}) == \
+           DataCache.hash_args((unhashable, 1), {"c": unhashable})
+    assert DataCache.hash_args((unhashable,), {}) == DataCache.hash_args((unhashable,), {})
+
+
+def test_typed_and_key():
+    counter = {"typed": 0, "key": 0}
+
+    @cache("*:*:10", typed=True)
+    def typed(value):
+        counter["typed"] += 1
+
+    typed(3)
+    typed(3.0)
+    typed(3)
+    assert counter["typed"] == 2
+
+    @cache("*:*:10", key=lambda user, request_id: user)
+    def by_user(user, request_id):
+        counter["key"] += 1
+
+    by_user("alice", 1)
+    by_user("alice", 2)
+    by_user("bob", 3)
+    assert counter["key"] == 2
+
+
+def test_hash_collision():
+    # hash(-1) == hash(-2) in CPython
+    @cache("*:*:10")
+    def method(*args):
+        return args
+
+    assert method(-1) == (-1,)
+    assert method(-2) == (-2,)
+    assert method(-1, 0) == (-1, 0)
+    assert method(-2, 0) == (-2, 0)
+
+    class Colliding:
+        def __init__(self, value):
+            self.value = value
+
+        def __hash__(self):
+            return 1
+
+        def __eq__(self, other):
+            return self.value == other.value
+
+    first, second = Colliding(1), Colliding(2)
+    assert method(first) == (first,)
+    assert method(second) == (second,)
+    assert method(Colliding(1))[0] is first
+
+
+def test_hashed_key():
+    key = DataCache.hash_args(tuple(range(20)), {"a": 3})
+    assert hash(key) == key.hash_value
+    assert key == DataCache.hash_args(tuple(range(20)), {"a": 3})
+    assert DataCache.hash_args(("single",), {}) == "single"
+    # Short keys are plain tuples
+    assert DataCache.hash_args((1, 2), {"a": 3}) == (1, 2) + _KWARGS_MARK + ("a", 3)
+
+
+def test_hash_by_content():
+    counter = {"value": 0}
+
+    @cache("*:*:10", hash_by_content=True, max_hash_bytes=1024)
+    def method(values, options=None):
+        counter["value"] += 1
+        return sum(values)
+
+    assert method([1, 2, 3], options={"a": [1]}) == 6
+    assert method([1, 2, 3], options={"a": [1]}) == 6
+    assert counter["value"] == 1
+
+    # Too large to be hashed, so the call is not cached
+    method(list(range(1000)))
+    method(list(range(1000)))
+    assert counter["value"] == 3
+
+
+def test_cache_stats():
+    @cache(expires_every="*:*:1", max_cache_size=2)
+    def method(value):
+        return value
+
+    method(1)
+    method(1)
+    method(2)
+    method(3)
+    sleep(1.1)
+    method(3)
+
+    info = method.cache_info()
+    assert (info.hits, info.misses, info.maxsize, info.currsize) == (1, 4, 2, 2)
+
+    stats = method.cache_stats()
+    assert stats.evictions == 1
+    assert stats.expirations == 1
+    assert stats.hit_rate == 0.2
+    assert sum(stats.miss_latency.values()) == 4
+    assert stats.miss_time > 0
+
+    assert cache_stats()[method.__wrapped__] == method.cache_stats()
+
+
+def test_cache_stats_threads():
+    @cache(expires_every="*:*:10", thread_safe=True)
+    def method(value):
+        return value
+
+    def work():
+        for i in range(100):
+            method(i % 10)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = method.cache_stats()
+    assert stats.hits + stats.misses == 400
+    assert stats.size == 10
+
+
+def test_miss_latency_histogram():
+    stats = CacheStats()
+    stats.miss(0.0000005)
+    stats.miss(0.003)
+    stats.miss(100)
+
+    statistics = stats.snapshot(0, 0)
+    assert statistics.miss_latency == {0.000001: 1, 0.004096: 1, float("inf"): 1}
+
+    stats.clear()
+    assert stats.snapshot(0, 0).misses == 0
+
+
+def test_stats_of_ended_threads():
+    stats = CacheStats()
+
+    def work():
+        stats.hit()
+
+    for _ in range(2000):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+    # The counters of the ended threads are folded into one total
+    assert len(stats._registry) <= 2
+    assert stats.snapshot(0, 0).hits == 2000
+
+
+def test_cache_hooks():
+    events = []
+    callbacks = {
+        "hit": lambda func, key: events.append(("hit", func.__name__, key)),
+        "miss": lambda func, key, latency: events.append(("miss", func.__name__, key)),
+        "store": lambda func, key, value: events.append(("store", func.__name__, key, value)),
+        "evict": lambda func, key: events.append(("evict", func.__name__, key)),
+        "expire": lambda func, key: events.append(("expire", func.__name__, key)),
+    }
+    for event, callback in callbacks.items():
+        add_hook(event, callback)
+
+    @cache(expires_every="*:*:1", max_cache_size=1)
+    def method(value):
+        return value * 2
+
+    try:
+        method("a")
+        method("a")
+        method("b")
+        sleep(1.1)
+        method("b")
+    finally:
+        for event, callback in callbacks.items():
+            remove_hook(event, callback)
+
+    assert events == [
+        ("store", "method", "a", "aa"),
+        ("miss", "method", "a"),
+        ("hit", "method", "a"),
+        ("evict", "method", "a"),
+        ("store", "method", "b", "bb"),
+        ("miss", "method", "b"),
+        ("expire", "method", "b"),
+        ("store", "method", "b", "bb"),
+        ("miss", "method", "b"),
+    ]
+
+    with pytest.raises(Exception):
+        add_hook("called", print)
+
+
+def test_thread_safe_hit_during_eviction():
+    @cache(expires_every="*:*:10", max_cache_size=4, thread_safe=True, eviction="lru")
+    def method(value):
+        return value
+
+    errors = []
+
+    def work(offset):
+        try:
+            for i in range(2000):
+                assert method((i + offset) % 12) == (i + offset) % 12
+        except Exception as ex:
+            errors.append(ex)
+
+    # The entry of a hit can be evicted by another thread at any time, the hit must still return its value
+    threads = [threading.Thread(target=work, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_cached_method():
+    class Counter:
+        def __init__(self, offset):
+            self.offset = offset
+            self.calls = 0
+
+        # Instances which compare equal must still have their own cache
+        def __eq__(self, other):
+            return True
+
+        @cached_method("*:*:10", max_cache_size=2)
+        def add(self, value):
+            self.calls += 1
+            return value + self.offset
+
+    first, second = Counter(1), Counter(100)
+    assert first.add(1) == 2
+    assert first.add(1) == 2
+    assert second.add(1) == 101
+    assert Counter.add(second, 1) == 101
+    assert (first.calls, second.calls) == (1, 1)
+
+    # The caches do not evict each other
+    for value in range(10):
+        second.add(value)
+    assert first.add(1) == 2
+    assert first.calls == 1
+    assert first.add.cache_info().hits == 2
+
+    caches = len(DataCache().cache)
+    del second
+    gc.collect()
+    assert len(DataCache().cache) == caches - 1
+    assert len(Counter.add._caches) == 1
+
+
+def test_cached_method_async():
+    class Service:
+        def __init__(self):
+            self.calls = 0
+
+        @cached_method("*:*:10")
+        async def load(self, value):
+            self.calls += 1
+            return value * 2
+
+    service = Service()
+    loop = asyncio.get_event_loop()
+    assert loop.run_until_complete(service.load(2)) == 4
+    assert loop.run_until_complete(service.load(2)) == 4
+    assert service.calls == 1
+    assert asyncio.iscoroutinefunction(service.load)
+
+
+def test_cached_method_requires_weak_references():
+    class Slotted:
+        __slots__ = ()
+
+        @cached_method("*:*:10")
+        def method(self):
+            return 1
+
+    with pytest.raises(Exception):
+        Slotted().method()
+
+    with pytest.raises(Exception):
+        cached_method("*:*:10", backend=object())
+
+
+def test_get_many():
+    batches = []
+
+    def load_all(arguments):
+        batches.append(arguments)
+        return [value * 2 for value, in arguments]
+
+    @cache("*:*:10", batch=load_all)
+    def double(value):
+        return value * 2
+
+    assert double(1) == 2
+    assert double.get_many([(1,), (2,), (3,), (2,)]) == [2, 4, 6, 4]
+    # Only the misses are loaded and every one only once
+    assert batches == [[(2,), (3,)]]
+    assert double.get_many([(3,), (1,)]) == [6, 2]
+    assert len(batches) == 1
+    assert double.cache_info().hits == 3
+    assert double.cache_info().misses == 4
+
+    # Unhashable arguments are computed but not cached
+    assert double.get_many([([1],)]) == [[1, 1]]
+    assert len(batches) == 2
+
+    @cache("*:*:10", batch=lambda arguments: [])
+    def broken(value):
+        return value
+
+    with pytest.raises(Exception):
+        broken.get_many([(1,)])
+
+    # Without a batch function, every miss calls the function
+    @cache("*:*:10")
+    def increment(value):
+        return value + 1
+
+    assert increment.get_many([(1,), (2,)]) == [2, 3]
+    assert increment.cache_info().currsize == 2
+
+
+def test_get_many_async():
+    batches = []
+
+    async def load_all(arguments):
+        batches.append(arguments)
+        return [value * 2 for value, in arguments]
+
+    @cache("*:*:10", batch=load_all)
+    async def double(value):
+        return value * 2
+
+    @cache("*:*:10")
+    async def increment(value):
+        return value + 1
+
+    loop = asyncio.get_event_loop()
+    assert loop.run_until_complete(double.get_many([(1,), (2,), (1,)])) == [2, 4, 2]
+    assert loop.run_until_complete(double.get_many([(2,), (3,)])) == [4, 6]
+    assert batches == [[(1,), (2,)], [(3,)]]
+    assert loop.run_until_complete(increment.get_many([(1,), (2,)])) == [2, 3]
+
+    with pytest.raises(Exception):
+        cache("*:*:10", batch=load_all)(lambda value: value)
+
+
+def test_refresh_ahead():
+    counter = {"value": 0}
+
+    @cache("*:*:2", refresh_ahead="*:*:1")
+    def compute(value):
+        counter["value"] += 1
+        return value * 2
+
+    assert compute(1) == 2
+    assert compute(2) == 4
+    assert compute(2) == 4
+
+    # Only the entry which was hit is recomputed before it expires
+    sleep(1.7)
+    assert counter["value"] == 3
+    sleep(0.6)
+    assert compute(2) == 4
+    assert counter["value"] == 3
+    assert compute(1) == 2
+    assert counter["value"] == 4
+
+    with pytest.raises(Exception):
+        cache("*:*:2", refresh_ahead="*:*:2")
+
+    with pytest.raises(Exception):
+        cache("*:*:2", refresh_ahead="*:*:1", refresh_ahead_keys=0)
+
+
+def test_refresh_ahead_async():
+    counter = {"value": 0}
+
+    @cache("*:*:2", refresh_ahead="*:*:1", thread_safe=True)
+    async def compute(value):
+        counter["value"] += 1
+        return value * 2
+
+    async def calls():
+        assert await compute(1) == 2
+        assert await compute(1) == 2
+        await asyncio.sleep(2.3)
+        assert await compute(1) == 2
+
+    asyncio.get_event_loop().run_until_complete(calls())
+    assert counter["value"] == 2
+    assert compute.cache_info().misses == 1
+
+
+def test_hot_keys():
+    function_cache = FunctionCache(10, compile_schedule(expires_every="*:*:10"))
+    function_cache.track_hits()
+    for key in range(3):
+        function_cache.add_cache_entry(key, key, arguments=((key,), {}))
+    function_cache.lookup(1)
+    function_cache.lookup(1)
+    function_cache.lookup(2)
+
+    hot_keys = function_cache.hot_keys(monotonic() + 20, 2)
+    assert [(hits, key, arguments) for hits, key, _, arguments in hot_keys] == [(2, 1, ((1,), {})), (1, 2, ((2,), {}))]
+    assert function_cache.hot_keys(monotonic() + 5, 2) == []
+
+    # A new value has to be hit again
+    function_cache.add_cache_entry(1, 1, arguments=((1,), {}))
+    assert [key for _, key, _, _ in function_cache.hot_keys(monotonic() + 20, 2)] == [2]
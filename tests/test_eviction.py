@@ -0,0 +1,149 @@
+import pytest
+
+from pycache._cache._eviction import FIFOPolicy, LRUPolicy, LFUPolicy, TinyLFUPolicy, FrequencySketch, \
+    create_eviction_policy
+from pycache._cache._memmory_db import FunctionCache
+
+
+def fill(function_cache: FunctionCache, *keys):
+    for key in keys:
+        function_cache.add_cache_entry(key, key)
+
+
+def test_fifo():
+    policy = FIFOPolicy(3)
+    for key in (1, 2, 3):
+        policy.on_insert(key)
+    policy.on_access(1)
+    assert policy.victim() == 1
+
+    policy.on_remove(1)
+    assert policy.victim() == 2
+
+
+def test_lru():
+    policy = LRUPolicy(3)
+    for key in (1, 2, 3):
+        policy.on_insert(key)
+    policy.on_access(1)
+    assert policy.victim() == 2
+
+    policy.on_remove(2)
+    assert policy.victim() == 3
+
+
+def test_lfu():
+    policy = LFUPolicy(3)
+    for key in (1, 2, 3):
+        policy.on_insert(key)
+    policy.on_access(1)
+    policy.on_access(1)
+    policy.on_access(3)
+    assert policy.victim() == 2
+
+    policy.on_remove(2)
+    assert policy.victim() == 3
+
+    # The minimal frequency has to be recovered after the last entry with it was removed
+    policy.on_remove(3)
+    assert policy.victim() == 1
+
+    policy.on_insert(4)
+    assert policy.victim() == 4
+
+
+def test_victims():
+    fifo, lru, lfu = FIFOPolicy(4), LRUPolicy(4), LFUPolicy(4)
+    for policy in (fifo, lru, lfu):
+        for key in (1, 2, 3, 4):
+            policy.on_insert(key)
+        policy.on_access(1)
+        policy.on_access(3)
+
+    assert fifo.victims(3) == [1, 2, 3]
+    assert lru.victims(3) == [2, 4, 1]
+    assert lfu.victims(3) == [2, 4, 1]
+    assert lfu.victims(10) == [2, 4, 1, 3]
+
+
+def test_lfu_frequency_order():
+    policy = LFUPolicy(4)
+    for key, accesses in (("a", 0), ("b", 3), ("c", 1), ("d", 5)):
+        policy.on_insert(key)
+        for _ in range(accesses):
+            policy.on_access(key)
+
+    # Every removal empties the bucket of the smallest frequency, the next one takes its place
+    for key in ("a", "c", "b", "d"):
+        assert policy.victim() == key
+        policy.on_remove(key)
+    assert policy._higher == {}
+    assert policy._lower == {}
+
+
+def test_frequency_sketch():
+    sketch = FrequencySketch(16)
+    for _ in range(5):
+        sketch.increment("hot")
+    sketch.increment("cold")
+
+    assert sketch.frequency("hot") >= 5
+    assert sketch.frequency("cold") >= 1
+    assert sketch.frequency("hot") > sketch.frequency("cold")
+
+    # Counters saturate and age
+    for _ in range(200):
+        sketch.increment("hot")
+    assert sketch.frequency("hot") <= 15
+
+
+def test_tinylfu_admission():
+    policy = TinyLFUPolicy(2)
+    policy.on_miss("hot")
+    policy.on_insert("hot")
+    policy.on_access("hot")
+
+    policy.on_miss("new")
+    assert not policy.admit("new", "hot")
+    for _ in range(3):
+        policy.on_miss("new")
+    assert policy.admit("new", "hot")
+
+
+def test_function_cache_lru():
+    function_cache = FunctionCache(2, eviction="lru")
+    fill(function_cache, 1, 2)
+    function_cache.get_value_from_cache(1)
+    fill(function_cache, 3)
+
+    assert sorted(function_cache.cache) == [1, 3]
+
+
+def test_function_cache_lfu():
+    function_cache = FunctionCache(2, eviction="lfu")
+    fill(function_cache, 1, 2)
+    function_cache.get_value_from_cache(2)
+    function_cache.get_value_from_cache(2)
+    function_cache.get_value_from_cache(1)
+    fill(function_cache, 3)
+
+    assert sorted(function_cache.cache) == [2, 3]
+
+
+def test_function_cache_tinylfu():
+    function_cache = FunctionCache(2, eviction="tinylfu")
+    fill(function_cache, 1, 2)
+    for _ in range(3):
+        function_cache.get_value_from_cache(1)
+        function_cache.get_value_from_cache(2)
+
+    # A one hit wonder does not push out the hot entries
+    fill(function_cache, 3)
+    assert sorted(function_cache.cache) == [1, 2]
+
+
+def test_unknown_policy():
+    with pytest.raises(Exception):
+        create_eviction_policy("random", 10)
+    with pytest.raises(Exception):
+        create_eviction_policy(dict, 10)
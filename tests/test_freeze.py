@@ -0,0 +1,102 @@
+from collections import OrderedDict
+
+import pytest
+
+from pycache._cache._freeze import freeze_key, identity_key, IdentityKey, UncacheableArguments
+
+
+def test_containers():
+    assert freeze_key(([1, 2],)) == freeze_key(([1, 2],))
+    assert freeze_key(([1, 2],)) != freeze_key(([2, 1],))
+    assert freeze_key(([1, 2],)) != freeze_key(((1, 2),))
+    assert freeze_key(({"a": [1], "b": {2}},)) == freeze_key(({"b": {2}, "a": [1]},))
+    assert freeze_key(({"a": 1},)) != freeze_key((OrderedDict(a=1),))
+    assert freeze_key(((1, [2]),)) == freeze_key(((1, [2]),))
+    assert freeze_key((bytearray(b"abc"),)) == freeze_key((bytearray(b"abc"),))
+    assert hash(freeze_key(([[1], {"a": [2]}],)))
+
+
+def test_cycles():
+    cyclic = [1]
+    cyclic.append(cyclic)
+    assert freeze_key((cyclic,)) == freeze_key((cyclic,))
+    assert hash(freeze_key((cyclic,)))
+
+    other = [1]
+    other.append(other)
+    assert freeze_key((cyclic,)) != freeze_key((other,))
+
+    cyclic_dict = {}
+    cyclic_dict["self"] = (cyclic_dict,)
+    assert freeze_key((cyclic_dict,)) == freeze_key((cyclic_dict,))
+
+    # A container which is used twice without a cycle is still frozen by its content
+    shared = [1]
+    assert freeze_key(([shared, shared],)) == freeze_key(([[1], [1]],))
+
+
+def test_dataclass():
+    # Dataclasses exist since Python 3.7
+    dataclasses = pytest.importorskip("dataclasses")
+
+    @dataclasses.dataclass
+    class Point:
+        x: int
+        y: list
+        label: str = dataclasses.field(default="", compare=False)
+
+    assert freeze_key((Point(1, [2], "a"),)) == freeze_key((Point(1, [2], "b"),))
+    assert freeze_key((Point(1, [2]),)) != freeze_key((Point(1, [3]),))
+
+
+def test_identity():
+    class Unhashable:
+        __hash__ = None
+
+    value = Unhashable()
+    assert freeze_key((value,)) == freeze_key((value,))
+    assert freeze_key((value,)) != freeze_key((Unhashable(),))
+    assert isinstance(freeze_key((value,))[0], IdentityKey)
+
+    values = [1]
+    assert identity_key((values, 1)) == identity_key((values, 1))
+    assert identity_key((values,)) != identity_key(([1],))
+
+
+def test_budget():
+    freeze_key(([0] * 100,), max_hash_bytes=800)
+    with pytest.raises(UncacheableArguments):
+        freeze_key(([0] * 101,), max_hash_bytes=800)
+
+
+def test_numpy():
+    numpy = pytest.importorskip("numpy")
+
+    array = numpy.arange(100, dtype=numpy.float64).reshape(10, 10)
+    assert freeze_key((array,)) == freeze_key((array.copy(),))
+    assert freeze_key((array,)) != freeze_key((array.reshape(100),))
+    assert freeze_key((array,)) != freeze_key((array.astype(numpy.float32),))
+    # Not contiguous
+    assert freeze_key((array[:, ::2],)) == freeze_key((array[:, ::2].copy(),))
+    assert freeze_key((numpy.array([[1], "a"], dtype=object),)) == freeze_key((numpy.array([[1], "a"], dtype=object),))
+
+    with pytest.raises(UncacheableArguments):
+        freeze_key((array,), max_hash_bytes=799)
+
+
+def test_numpy_special_arrays():
+    numpy = pytest.importorskip("numpy")
+
+    # Empty arrays only differ by their shape
+    assert freeze_key((numpy.zeros((0, 3)),)) == freeze_key((numpy.zeros((0, 3)),))
+    assert freeze_key((numpy.zeros((0, 3)),)) != freeze_key((numpy.zeros((3, 0)),))
+
+    # dtypes which are not supported by the buffer protocol
+    dates = numpy.array(["2021-01-01", "2021-01-02"], dtype="datetime64[D]")
+    assert freeze_key((dates,)) == freeze_key((dates.copy(),))
+    assert freeze_key((dates,)) != freeze_key((dates[::-1],))
+
+    # One dimensional views which are not contiguous
+    values = numpy.arange(10)
+    assert freeze_key((values[::2],)) == freeze_key((values[::2].copy(),))
+    assert freeze_key((values[::2],)) != freeze_key((values[1::2],))
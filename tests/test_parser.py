@@ -1,10 +1,12 @@
 from calendar import monthrange
 from datetime import datetime, timedelta
 from random import randrange
+from time import monotonic
 
 import pytest
 
-from pycache._shared._parser import parse_expires_at, parse_expires_every, get_schedule_type
+from pycache._shared._parser import parse_expires_at, parse_expires_every, get_schedule_type, Schedule, \
+    ScheduleType, compile_schedule
 
 
 def time_equals(t1: datetime, t2: datetime):
@@ -117,3 +119,50 @@ def test_edge_cases():
         parse_expires_at("23:59:59", overflow_month),
         datetime(current.year + 1, 1, 1, 23, 59, 59)
     )
+
+
+def test_compiled_schedule():
+    every = compile_schedule(expires_every="1:2:3")
+    assert every.schedule_type == ScheduleType.EVERY
+    assert every.interval == 60 * 60 + 2 * 60 + 3
+
+    current = datetime(2021, 5, 10, 12, 30, 15)
+    assert every.next_deadline(current) == current + timedelta(hours=1, minutes=2, seconds=3)
+    assert compile_schedule(expires_every="*:*:*").next_deadline(current) == current
+
+    assert compile_schedule(expires_at="*:*:10").next_deadline(current) == datetime(2021, 5, 10, 12, 31, 10)
+    assert compile_schedule(expires_at="*:15:00").next_deadline(current) == datetime(2021, 5, 10, 13, 15, 0)
+    assert compile_schedule(expires_at="*:45:*").next_deadline(current) == datetime(2021, 5, 10, 12, 45, 15)
+    assert compile_schedule(expires_at="08:00:00").next_deadline(current) == datetime(2021, 5, 11, 8, 0, 0)
+    assert compile_schedule(expires_at="23:59:59").next_deadline(current) == datetime(2021, 5, 10, 23, 59, 59)
+
+
+def test_compiled_schedule_is_validated_once():
+    with pytest.raises(Exception):
+        Schedule(ScheduleType.AT, "00:00:60")
+    with pytest.raises(Exception):
+        compile_schedule()
+
+
+def test_monotonic_deadline():
+    every = compile_schedule(expires_every="*:1:0")
+    before = monotonic()
+    assert before + 60 <= every.next_monotonic_deadline() <= monotonic() + 60
+
+    at = compile_schedule(expires_at="*:*:30")
+    deadline = at.next_monotonic_deadline()
+    assert monotonic() < deadline <= monotonic() + 60
+    assert at.next_monotonic_deadline() == deadline
+
+
+def test_deadline_after():
+    every = compile_schedule(expires_every="*:1:0")
+    before = monotonic()
+    assert before + 60 <= every.deadline_after(before + 10) <= monotonic() + 60
+
+    at = compile_schedule(expires_at="*:*:30")
+    deadline = at.next_monotonic_deadline()
+    # The deadline after the next one is one minute later
+    assert abs(at.deadline_after(deadline) - deadline - 60) < 1
+    # A deadline in the past is followed by the next one
+    assert at.deadline_after(deadline - 120) == deadline
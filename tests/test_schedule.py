@@ -1,9 +1,14 @@
 import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-from time import sleep
+import pytest
+from time import sleep, monotonic
 
-from pycache import add_schedule, schedule
+from pycache import add_schedule, schedule, add_hook, remove_hook
+from pycache._scheduler._async_engine import AsyncScheduler
+from pycache._scheduler._engine import SchedulerEngine
 
 
 def test_interval():
@@ -108,3 +113,361 @@ def test_call_from_async():
     loop.run_until_complete(call())
 
     assert counter["hello"] == 1
+
+
+def test_single_scheduler_thread():
+    counter = {"hello": 0}
+
+    def internal():
+        counter["hello"] += 1
+
+    threads_before = threading.active_count()
+    subscriptions = [add_schedule(internal, "0:0:1") for _ in range(200)]
+    assert threading.active_count() <= threads_before + 1
+
+    sleep(1.5)
+    for subscription in subscriptions:
+        subscription.stop()
+
+    assert counter["hello"] == 200
+
+
+def test_failing_job():
+    counter = {"hello": 0}
+
+    def failing():
+        raise ValueError("failed")
+
+    def internal():
+        counter["hello"] += 1
+
+    failing_subscription = add_schedule(failing, "0:0:1")
+    subscription = add_schedule(internal, "0:0:1")
+    # Starting a running subscription does not schedule it twice
+    subscription.start()
+    sleep(2.5)
+    failing_subscription.stop()
+    subscription.stop()
+
+    assert counter["hello"] == 2
+
+
+def test_async_scheduler_without_threads():
+    counter = {"hello": 0}
+
+    async def internal():
+        counter["hello"] += 1
+
+    loop = asyncio.new_event_loop()
+
+    async def call():
+        threads_before = threading.active_count()
+        subscriptions = [add_schedule(internal, call_every="0:0:1", event_loop=loop) for _ in range(1000)]
+        assert threading.active_count() == threads_before
+
+        await asyncio.sleep(2.5)
+        for subscription in subscriptions:
+            subscription.stop()
+        await asyncio.sleep(1)
+
+    loop.run_until_complete(call())
+    loop.close()
+
+    assert counter["hello"] == 2000
+
+
+def test_async_scheduler_stop_from_thread():
+    counter = {"hello": 0}
+
+    async def internal():
+        counter["hello"] += 1
+
+    loop = asyncio.new_event_loop()
+    subscription = add_schedule(internal, call_every="0:0:1", event_loop=loop, stop_after=5)
+    threading.Timer(1.5, subscription.stop).start()
+
+    loop.run_until_complete(asyncio.sleep(3))
+    loop.close()
+
+    assert counter["hello"] == 1
+
+
+def test_executor_overlap():
+    def internal(started):
+        started["hello"] += 1
+        sleep(2.5)
+
+    results = {}
+    with ThreadPoolExecutor(4) as executor:
+        for overlap in ("skip", "queue", "concurrent"):
+            started = {"hello": 0}
+            results[overlap] = started
+            subscription = add_schedule(internal, "0:0:1", args=(started,), executor=executor, overlap=overlap)
+            results[overlap + "_subscription"] = subscription
+
+        sleep(3.8)
+        for overlap in ("skip", "queue", "concurrent"):
+            results[overlap + "_subscription"].stop()
+
+    # skip: 1s runs, 2s and 3s are skipped
+    assert results["skip"]["hello"] == 1
+    # queue: 1s runs, 2s waits until the first run finished at 3.5s
+    assert results["queue"]["hello"] == 2
+    # concurrent: every fire runs
+    assert results["concurrent"]["hello"] == 3
+
+
+def test_queue_is_bounded():
+    release = threading.Event()
+    started = []
+    missed = []
+
+    def internal():
+        started.append(monotonic())
+        release.wait()
+
+    def on_missed(subscription, missed_calls):
+        if subscription._func is internal:
+            missed.append(missed_calls)
+
+    add_hook("missed", on_missed)
+    try:
+        with ThreadPoolExecutor(4) as executor:
+            subscription = add_schedule(internal, "0:0:1", executor=executor, overlap="queue")
+            # 1s runs, 2s is queued, 3s is skipped because the queue is full
+            sleep(3.5)
+            subscription.stop()
+            release.set()
+            sleep(0.5)
+    finally:
+        remove_hook("missed", on_missed)
+
+    # The queued run is dropped by stop
+    assert len(started) == 1
+    assert sum(missed) >= 1
+
+
+def test_event_loop_overlap():
+    counter = {"hello": 0}
+
+    async def internal():
+        counter["hello"] += 1
+        await asyncio.sleep(2.5)
+
+    loop = asyncio.new_event_loop()
+    subscription = add_schedule(internal, call_every="0:0:1", event_loop=loop)
+    loop.run_until_complete(asyncio.sleep(3.5))
+    subscription.stop()
+    loop.run_until_complete(asyncio.sleep(0.5))
+    loop.close()
+
+    # 1s runs, 2s and 3s are skipped as for executors
+    assert counter["hello"] == 1
+
+
+def test_executor_coroutine():
+    counter = {"hello": 0}
+
+    async def internal():
+        counter["hello"] += 1
+
+    with ThreadPoolExecutor(1) as executor:
+        subscription = add_schedule(internal, "0:0:1", executor=executor, stop_after=2)
+        sleep(2.5)
+        subscription.stop()
+
+    assert counter["hello"] == 2
+
+    with pytest.raises(Exception):
+        add_schedule(internal, "0:0:1", overlap="replace")
+
+
+def test_fixed_rate():
+    counters = {"fixed_rate": 0, "fixed_delay": 0}
+
+    def internal(mode):
+        counters[mode] += 1
+        sleep(0.5)
+
+    fixed_rate = add_schedule(internal, "0:0:1", args=("fixed_rate",))
+    sleep(3.3)
+    fixed_rate.stop()
+
+    fixed_delay = add_schedule(internal, "0:0:1", args=("fixed_delay",), mode="fixed_delay")
+    sleep(3.3)
+    fixed_delay.stop()
+
+    # Fixed rate fires at 1s, 2s, 3s. Fixed delay at 1s and 2.5s
+    assert counters["fixed_rate"] == 3
+    assert counters["fixed_delay"] == 2
+
+
+def test_misfire():
+    def internal():
+        pass
+
+    for misfire, expected_slots in (("coalesce", (3, 4)), ("catch_up", (1, 2))):
+        subscription = add_schedule(internal, "0:0:1", misfire=misfire)
+        subscription.stop()
+
+        # Pretend that the scheduler was blocked for 3.5 seconds
+        subscription._anchor = monotonic() - 3.5
+        subscription._slot = 0
+        assert subscription._next_deadline() == subscription._anchor + expected_slots[0]
+        assert subscription._next_deadline() == subscription._anchor + expected_slots[1]
+
+    with pytest.raises(Exception):
+        add_schedule(internal, "0:0:1", mode="cron")
+    with pytest.raises(Exception):
+        add_schedule(internal, "0:0:1", misfire="ignore")
+
+
+def test_schedule_hooks():
+    events = []
+    callbacks = {
+        "fire": lambda subscription, lateness: events.append(("fire", subscription, lateness >= 0)),
+        "start": lambda subscription: events.append(("start", subscription)),
+        "finish": lambda subscription, duration: events.append(("finish", subscription, duration >= 0.1)),
+        "error": lambda subscription, exception, duration: events.append(("error", subscription, str(exception))),
+        "missed": lambda subscription, missed_calls: events.append(("missed", subscription, missed_calls)),
+    }
+    for event, callback in callbacks.items():
+        add_hook(event, callback)
+
+    def failing():
+        raise ValueError("failed")
+
+    try:
+        subscription = add_schedule(lambda: sleep(0.1), "0:0:1", stop_after=1)
+        sleep(1.5)
+        assert events == [("fire", subscription, True), ("start", subscription), ("finish", subscription, True)]
+
+        events.clear()
+        failing_subscription = add_schedule(failing, "0:0:1", stop_after=1)
+        sleep(1.5)
+        assert events[-1] == ("error", failing_subscription, "failed")
+
+        events.clear()
+        subscription = add_schedule(lambda: None, "0:0:1")
+        subscription.stop()
+        subscription._anchor = monotonic() - 3.5
+        subscription._slot = 0
+        subscription._next_deadline()
+        assert events == [("missed", subscription, 2)]
+    finally:
+        for event, callback in callbacks.items():
+            remove_hook(event, callback)
+
+
+def test_daemon_subscription():
+    fired = threading.Event()
+    daemon = []
+
+    class Job:
+        _generation = 0
+
+        def _fire(self):
+            daemon.append(threading.current_thread().daemon)
+            fired.set()
+
+    engine = SchedulerEngine()
+    job = Job()
+    engine.add(job, monotonic() + 0.1, daemon=True)
+    assert fired.wait(1)
+    engine.remove(job)
+    # Only daemon subscriptions do not keep the interpreter alive
+    assert daemon == [True]
+
+
+def test_slow_job_does_not_delay_others():
+    counter = {"hello": 0}
+
+    def slow():
+        sleep(2)
+
+    def internal():
+        counter["hello"] += 1
+
+    slow_subscription = add_schedule(slow, "0:0:1")
+    subscription = add_schedule(internal, "0:0:1")
+    sleep(5.5)
+    slow_subscription.stop()
+    subscription.stop()
+
+    assert counter["hello"] == 5
+
+
+def test_engine_survives_failing_fire():
+    counter = {"hello": 0}
+
+    class Broken:
+        _generation = 0
+
+        def _fire(self):
+            raise RuntimeError("broken")
+
+    def internal():
+        counter["hello"] += 1
+
+    engine = SchedulerEngine()
+    broken = Broken()
+    engine.add(broken, monotonic())
+    subscription = add_schedule(internal, "0:0:1")
+    sleep(1.5)
+    subscription.stop()
+    engine.remove(broken)
+
+    assert counter["hello"] == 1
+
+
+def test_coroutine_without_event_loop():
+    loops = set()
+
+    async def internal():
+        loops.add(asyncio.get_event_loop())
+
+    subscriptions = [add_schedule(internal, "0:0:1") for _ in range(3)]
+    sleep(2.5)
+    for subscription in subscriptions:
+        subscription.stop()
+
+    # All coroutine jobs run in the same event loop
+    assert loops == {SchedulerEngine().event_loop}
+
+
+def test_async_scheduler_of_closed_loop_is_dropped():
+    closed_loop = asyncio.new_event_loop()
+    AsyncScheduler.for_loop(closed_loop)
+    closed_loop.close()
+
+    loop = asyncio.new_event_loop()
+    AsyncScheduler.for_loop(loop)
+    assert closed_loop not in AsyncScheduler._schedulers
+    loop.close()
+
+
+def test_executor_shut_down():
+    counter = {"hello": 0}
+    errors = []
+
+    def internal():
+        counter["hello"] += 1
+
+    def on_error(subscription, exception, duration):
+        errors.append(exception)
+
+    executor = ThreadPoolExecutor(1)
+    executor.shutdown()
+    add_hook("error", on_error)
+    try:
+        broken_subscription = add_schedule(internal, "0:0:1", executor=executor)
+        subscription = add_schedule(internal, "0:0:1")
+        sleep(2.5)
+        broken_subscription.stop()
+        subscription.stop()
+    finally:
+        remove_hook("error", on_error)
+
+    assert counter["hello"] == 2
+    assert len(errors) == 2
+    assert broken_subscription._instances == 0